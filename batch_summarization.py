@@ -0,0 +1,211 @@
+"""
+        Batch Summarization
+
+Summarize every cluster of documents under a directory, such as
+doc/unprocessed_data, where every sub-directory (e.g. d30045t) is a
+cluster and every file in it is a document of the cluster.
+
+The clusters are summarized concurrently by a pool of worker processes,
+while the document files of the next cluster are read in the
+background. One summary file per cluster is output, named after the
+cluster as D30045.M.100.T.TT is after d30045t.
+
+A cluster failing, e.g. by a document without its text, is reported
+on stderr and the other clusters are still summarized, while the exit
+status is non-zero at the end.
+
+With --stem-table, the workers start with the stems of the table, and
+the stems they learn are saved into it when the clusters are
+summarized, even if some failed, so that the next run starts warm.
+
+usage:
+
+ $ python3 batch_summarization.py doc/unprocessed_data doc/systems/04systems -w 4 --stem-table doc/cache/stems.txt
+
+"""
+
+import argparse
+import os
+import sys
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, \
+    ThreadPoolExecutor
+
+from document_process import CachedStemmer, get_stemmer, \
+    init_stem_worker, read_content
+from document_summarization import summarize
+
+DATA_PATH = 'doc/unprocessed_data/'
+SYSTEM_PATH = 'doc/systems/04systems/'
+
+'''
+return a list of (cluster, doc_path, doc_list) of all of the clusters
+under the root directory, ordered by cluster name
+'''
+
+
+def find_clusters(root: str):
+    clusters = []
+    for cluster in sorted(os.listdir(root)):
+        doc_path = os.path.join(root, cluster, '')
+        if cluster.startswith('.') or not os.path.isdir(doc_path):
+            continue
+        doc_list = tuple(f for f in sorted(os.listdir(doc_path))
+                         if not f.startswith('.')
+                         and os.path.isfile(doc_path + f))
+        if doc_list:
+            clusters.append((cluster, doc_path, doc_list))
+    return clusters
+
+
+# d30045t -> D30045.M.100.T.TT
+def summary_file_name(cluster: str):
+    if cluster.endswith('t'):
+        cluster = cluster[:-1]
+    return cluster.upper() + '.M.100.T.TT'
+
+
+def read_cluster(doc_path: str, doc_list: tuple):
+    return [read_content(doc_path + f) for f in doc_list]
+
+
+'''
+summarize a cluster whose document files have been read, and write the
+summary to out_path, one sentence per line. return the summary file.
+'''
+
+
+def summarize_cluster(cluster: str, doc_path: str, doc_list: tuple,
+                      contents: list, out_path: str):
+    summary = summarize(doc_path, doc_list, contents=contents)
+    out_file = os.path.join(out_path, summary_file_name(cluster))
+    outfile = open(out_file, 'w')
+    for sentence in summary:
+        outfile.write(sentence + '.\n')
+    outfile.close()
+    return out_file
+
+
+# summarize a cluster in a worker process, and report the new stems,
+# which are learned even if the cluster fails
+def _summarize_in_worker(*args):
+    try:
+        out_file, error = summarize_cluster(*args), None
+    except Exception as e:
+        out_file, error = None, repr(e)
+    return out_file, error, get_stemmer().report()
+
+
+# a future failed by the error, of a cluster never summarized
+def _failed(error: Exception):
+    future = Future()
+    future.set_exception(error)
+    return future
+
+
+'''
+summarize all of the clusters under root with a pool of workers, and
+write the summaries into out_path. the document files of the next
+cluster are read while the submitted ones are being summarized, and
+at most `workers` clusters are in the pool at the same time, so that
+the read contents do not pile up. a generator of (cluster, summary
+file, None) in the order of the clusters, or (cluster, None, error) of
+a cluster failing to be read or summarized, which does not stop the
+other clusters. the stems learned by the workers are merged into
+stems, a CachedStemmer, whose cache the workers start with.
+'''
+
+
+def batch_summarize(root: str, out_path: str, workers: int = 1,
+                    stems: CachedStemmer = None):
+    clusters = find_clusters(root)
+    if not clusters:
+        return
+    os.makedirs(out_path, exist_ok=True)
+    if stems is None:
+        stems = CachedStemmer()
+    reader = ThreadPoolExecutor(max_workers=1)
+    pool = ProcessPoolExecutor(max_workers=workers,
+                               initializer=init_stem_worker,
+                               initargs=(None, list(stems.cache.items())))
+    pending = deque()
+
+    # (summary file, None) or (None, error) of a cluster
+    def result(future):
+        try:
+            out_file, error, report = future.result()
+        except Exception as e:
+            # the cluster could not be read, or its worker crashed
+            return None, repr(e)
+        stems.merge(report)
+        return out_file, error
+
+    try:
+        next_contents = reader.submit(read_cluster, *clusters[0][1:])
+        for idx, (cluster, doc_path, doc_list) in enumerate(clusters):
+            contents_future = next_contents
+            # prefetch the document files of the next cluster
+            if idx + 1 < clusters.__len__():
+                next_contents = reader.submit(read_cluster,
+                                              *clusters[idx + 1][1:])
+            while pending.__len__() >= workers:
+                done_cluster, future = pending.popleft()
+                yield (done_cluster,) + result(future)
+            try:
+                future = pool.submit(_summarize_in_worker, cluster, doc_path,
+                                     doc_list, contents_future.result(),
+                                     out_path)
+            except Exception as e:
+                future = _failed(e)
+            pending.append((cluster, future))
+        while pending:
+            done_cluster, future = pending.popleft()
+            yield (done_cluster,) + result(future)
+    finally:
+        reader.shutdown(wait=True)
+        pool.shutdown(wait=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='summarize every cluster of documents under a directory')
+    parser.add_argument('root', nargs='?', default=DATA_PATH,
+                        help='directory of the cluster directories')
+    parser.add_argument('out_path', nargs='?', default=SYSTEM_PATH,
+                        help='directory of the summary files')
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count(),
+                        help='number of clusters summarized at the same time')
+    parser.add_argument('--stem-table',
+                        help='stem cache table, loaded by the workers and '
+                             'saved when the clusters are summarized')
+    args = parser.parse_args()
+    stems = CachedStemmer(path=args.stem_table)
+    failed = []
+    try:
+        for cluster, out_file, error in batch_summarize(
+                args.root, args.out_path, args.workers, stems):
+            if error is not None:
+                failed.append(cluster)
+                print('%s failed: %s' % (cluster, error), file=sys.stderr)
+            else:
+                print(cluster, '->', out_file)
+    finally:
+        if args.stem_table:
+            stems.save(args.stem_table)
+    info = stems.info()
+    print('stem cache: %d hits, %d misses, %d of %d stems'
+          % (info['hits'], info['misses'], info['size'], info['max_size']),
+          file=sys.stderr)
+    if failed:
+        print('%d clusters failed: %s' % (failed.__len__(),
+                                          ' '.join(failed)),
+              file=sys.stderr)
+        sys.exit(1)
+
+
+'''
+//  main  //
+'''
+
+if __name__ == '__main__':
+    main()
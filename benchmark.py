@@ -0,0 +1,287 @@
+"""
+        Benchmark
+
+Time every stage of the summarization, and record the peak memory of
+every stage, on the bundled cluster d30045t and on larger corpora like
+it, so that the scaling of every stage can be seen.
+
+The stages are
+
+ split_sentences    split the documents into sentences
+ delete_stop_words  delete stop words in all sentences
+ porter_stemming    stem all stop-word-free sentences
+ doc_process        construct DocProcess, i.e. all of the above
+                    as well as count_word
+ tf_idf             the TF-IDF algorithm over the sparse matrix
+ tf_idf_dense       the TF-IDF algorithm returning a dense matrix, which
+                    is skipped if the matrix would exceed the dense limit
+ selection          select the sentences of the summary
+
+A corpus of scale k > 1 is a synthetic cluster of k times as many
+documents, generated by corpus_generator.py with the mean and the
+standard deviation of the sentence and the document lengths of the
+corpus. Its vocabulary grows by Heaps' law, i.e. as the square root of
+k, so that the number of words grows with the corpus as in real ones.
+The time of a stage is the median of some runs, while its peak memory
+is traced by tracemalloc in another run.
+
+The results are written into a JSON file, which can be compared with a
+saved one to flag the regressions. A stage is regressed if it is
+slower or bigger by more than the tolerance, and by more than a few
+milliseconds or KiB, so that the noise of the fast stages of small
+corpora is not flagged.
+
+usage:
+
+ $ python3 benchmark.py -s 1 10 100 1000 -o benchmark.json
+ $ python3 benchmark.py -s 1 10 100 1000 -o new.json -c benchmark.json
+
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from corpus_generator import SEED, CorpusGenerator, generate_corpus
+from document_process import CachedStemmer, DocProcess, delete_stop_words, \
+    porter_stemming, read_sentences, split_sentences
+from document_summarization import select_summary, sparse_tf_idf, tf_idf
+
+DOC_PATH = 'doc/unprocessed_data/d30045t/'
+OUTPUT = 'benchmark.json'
+SCALES = (1, 10, 100, 1000)
+REPEAT = 3
+# the max bytes of a dense sentence-word matrix to be benchmarked
+DENSE_LIMIT = 2 ** 30
+DENSE_STAGES = ('tf_idf_dense',)
+# a stage is regressed if it is slower or bigger by more than this
+TOLERANCE = 0.2
+# and by more than these seconds or bytes
+MIN_SECONDS = 0.005
+MIN_BYTES = 16 * 2 ** 10
+
+'''
+the statistics of the documents, as the arguments of a CorpusGenerator
+generating documents like them: the (mean, standard deviation) of the
+words in a sentence and of the sentences in a document, and the number
+of distinct words
+'''
+
+
+def corpus_statistics(doc_path: str, documents: tuple):
+    docs = [read_sentences(doc_path + f) for f in documents]
+    sentence_lengths = [s.split(' ').__len__() for doc in docs for s in doc]
+    document_lengths = [doc.__len__() for doc in docs]
+    words = set(w.lower() for doc in docs for s in doc for w in s.split(' '))
+    return {'sentence_length': (float(np.mean(sentence_lengths)),
+                                float(np.std(sentence_lengths))),
+            'document_length': (float(np.mean(document_lengths)),
+                                float(np.std(document_lengths))),
+            'vocabulary_size': words.__len__()}
+
+
+'''
+make a corpus of scale times as many documents as the ones in doc_path,
+which is a synthetic cluster like them in a new directory under
+work_path, or doc_path itself if scale is 1. return (path, documents)
+of the corpus.
+'''
+
+
+def make_corpus(doc_path: str, scale: int, work_path: str,
+                seed: int = SEED):
+    documents = tuple(sorted(f for f in os.listdir(doc_path)
+                             if os.path.isfile(os.path.join(doc_path, f))))
+    if scale == 1:
+        return doc_path, documents
+    statistics = corpus_statistics(doc_path, documents)
+    generator = CorpusGenerator(
+        seed, int(statistics['vocabulary_size'] * math.sqrt(scale)),
+        sentence_length=statistics['sentence_length'],
+        document_length=statistics['document_length'])
+    cluster, path, corpus = generate_corpus(
+        os.path.join(work_path, 'x' + str(scale)), 1,
+        documents.__len__() * scale, generator)[0]
+    return path, corpus
+
+
+'''
+the stages as a list of (name, run), where run(state) runs the stage on
+the results of the former stages in state and returns its result
+'''
+
+
+def stages(path: str, documents: tuple):
+    return [
+        ('split_sentences',
+         lambda state: split_sentences(path, documents)),
+        ('delete_stop_words',
+         lambda state: [[delete_stop_words(s) for s in doc]
+                        for doc in state['split_sentences']]),
+        ('porter_stemming',
+         lambda state: [porter_stemming(doc, CachedStemmer())
+                        for doc in state['delete_stop_words']]),
+        ('doc_process',
+         lambda state: DocProcess(path, documents, stemmer=CachedStemmer())),
+        ('tf_idf',
+         lambda state: sparse_tf_idf(state['doc_process'])),
+        ('tf_idf_dense',
+         lambda state: tf_idf(state['doc_process'])),
+        ('selection',
+         lambda state: select_summary(state['doc_process'],
+                                      *state['tf_idf'])),
+    ]
+
+
+# run the stage and return (result, seconds, peak bytes)
+def measure(run, state, repeat: int):
+    spent = []
+    for i in range(repeat):
+        begin = time.perf_counter()
+        result = run(state)
+        spent.append(time.perf_counter() - begin)
+        del result
+    seconds = float(np.median(spent))
+    tracemalloc.start()
+    result = run(state)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, seconds, peak
+
+
+# the bytes of the dense sentence-word matrix of a DocProcess
+def dense_bytes(data: DocProcess):
+    return data.sen_size_total() * data.vocabulary.__len__() * 8
+
+
+def benchmark(doc_path: str = DOC_PATH, scales: tuple = SCALES,
+              repeat: int = REPEAT, dense_limit: int = DENSE_LIMIT):
+    results = []
+    work_path = tempfile.mkdtemp(prefix='benchmark-')
+    try:
+        for scale in scales:
+            path, documents = make_corpus(doc_path, scale, work_path)
+            state = {}
+            for name, run in stages(path, documents):
+                if name in DENSE_STAGES \
+                        and dense_bytes(state['doc_process']) > dense_limit:
+                    print('x%-5d %-18s skipped, the dense matrix is %d B'
+                          % (scale, name, dense_bytes(state['doc_process'])),
+                          file=sys.stderr)
+                    continue
+                state[name], seconds, peak = measure(run, state, repeat)
+                if name in DENSE_STAGES:
+                    state[name] = None
+                results.append({
+                    'corpus': os.path.basename(doc_path.rstrip('/')),
+                    'scale': scale,
+                    'documents': documents.__len__(),
+                    'sentences': sum(doc.__len__()
+                                     for doc in state['split_sentences']),
+                    'words': state['doc_process'].vocabulary.__len__()
+                    if 'doc_process' in state else None,
+                    'stage': name,
+                    'seconds': seconds,
+                    'peak_bytes': peak})
+                print('x%-5d %-18s %10.4f s %12d B'
+                      % (scale, name, seconds, peak), file=sys.stderr)
+    finally:
+        shutil.rmtree(work_path, ignore_errors=True)
+    return {'python': platform.python_version(),
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'results': results}
+
+
+'''
+compare the results with the baseline ones, and return a list of the
+regressions, i.e. the stages which are slower or bigger than their
+baseline by more than the tolerance
+'''
+
+
+def compare(report: dict, baseline: dict, tolerance: float = TOLERANCE,
+            min_seconds: float = MIN_SECONDS, min_bytes: int = MIN_BYTES):
+    base = {(r['corpus'], r['scale'], r['stage']): r
+            for r in baseline['results']}
+    floors = {'seconds': min_seconds, 'peak_bytes': min_bytes}
+    regressions = []
+    for r in report['results']:
+        b = base.get((r['corpus'], r['scale'], r['stage']))
+        if b is None:
+            continue
+        for metric in ('seconds', 'peak_bytes'):
+            if b[metric] and r[metric] > b[metric] * (1 + tolerance) \
+                    and r[metric] - b[metric] > floors[metric]:
+                regressions.append({'corpus': r['corpus'],
+                                    'scale': r['scale'],
+                                    'stage': r['stage'],
+                                    'metric': metric,
+                                    'baseline': b[metric],
+                                    'value': r[metric],
+                                    'ratio': r[metric] / b[metric]})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='benchmark every stage of the summarization')
+    parser.add_argument('-d', '--doc-path', default=DOC_PATH,
+                        help='directory of the documents of the corpus')
+    parser.add_argument('-s', '--scales', type=int, nargs='+',
+                        default=SCALES, help='copies of the corpus to run')
+    parser.add_argument('-r', '--repeat', type=int, default=REPEAT,
+                        help='runs of every stage, the median is taken')
+    parser.add_argument('--dense-limit', type=int,
+                        default=DENSE_LIMIT // 2 ** 20,
+                        help='MiB of the largest dense matrix to benchmark')
+    parser.add_argument('-o', '--output', default=OUTPUT,
+                        help='JSON file of the results')
+    parser.add_argument('-c', '--compare', metavar='BASELINE',
+                        help='JSON file of the baseline results')
+    parser.add_argument('-t', '--tolerance', type=float, default=TOLERANCE,
+                        help='ratio of slowdown or growth to be flagged')
+    parser.add_argument('--min-seconds', type=float, default=MIN_SECONDS,
+                        help='slowdown in seconds below which it is noise')
+    parser.add_argument('--min-bytes', type=int, default=MIN_BYTES,
+                        help='growth in bytes below which it is noise')
+    args = parser.parse_args()
+
+    report = benchmark(os.path.join(args.doc_path, ''), tuple(args.scales),
+                       args.repeat, args.dense_limit * 2 ** 20)
+    outfile = open(args.output, 'w')
+    json.dump(report, outfile, indent=1)
+    outfile.close()
+    print('The results are output in ' + args.output, file=sys.stderr)
+
+    if args.compare:
+        infile = open(args.compare, 'r')
+        baseline = json.load(infile)
+        infile.close()
+        regressions = compare(report, baseline, args.tolerance,
+                              args.min_seconds, args.min_bytes)
+        for r in regressions:
+            print('REGRESSION x%d %s %s: %g -> %g (%.2fx)'
+                  % (r['scale'], r['stage'], r['metric'], r['baseline'],
+                     r['value'], r['ratio']))
+        if regressions:
+            sys.exit(1)
+        print('No regression against ' + args.compare)
+
+
+'''
+//  main  //
+'''
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""
+        Cluster Cache
+
+A binary cache of the processed data of a cluster of documents, so that
+summarizing the same cluster again skips the document process and the
+TF-IDF algorithm.
+
+A cluster is cached in a directory named after the hash of the contents
+of its documents and the stop words, as the following files:
+
+ tf_idf_indptr.npy    the sentence-word TF-IDF matrix in CSR form, i.e.
+ tf_idf_indices.npy   the row pointers, the word index of every stored
+ tf_idf_values.npy    entry and its TF-IDF value, so that the files grow
+                      with the stored entries, not sentences x words
+ long_sen_vector.npy  the TF-IDF vector of all sentences as a long one
+ sen_offsets.npy      the row of the first sentence of every doc,
+                      the last element is the number of all sentences
+ text_offsets.npy     the byte offset of every sentence in sentences.txt,
+                      the last element is the size of sentences.txt
+ sentences.txt        the original sentences in utf-8, without separator
+ words.txt            the word list, one word per line
+
+The arrays are memory-mapped when they are loaded, so that only the
+rows in need are read from the disk. The sparse matrix is used by
+SimilarityIndex as it is.
+
+"""
+
+import hashlib
+import os
+import shutil
+
+import numpy as np
+from document_process import SentenceStore, SentenceTermMatrix, \
+    load_vocabulary
+
+# change it whenever the files of a cached cluster change
+CACHE_VERSION = b'2'
+
+'''
+the hash of the contents of the document files and the stop words,
+which is the name of the cache directory of the cluster
+'''
+
+
+def cache_key(contents: list, stop_words):
+    h = hashlib.sha1(CACHE_VERSION)
+    for content in contents:
+        content = content.encode('utf-8')
+        h.update(str(content.__len__()).encode() + b'\n')
+        h.update(content)
+    h.update('\n'.join(sorted(stop_words.words)).encode('utf-8'))
+    return h.hexdigest()
+
+
+'''
+a cluster loaded from the cache, which can be used in place of
+DocProcess in summarize
+'''
+
+
+class CachedCluster:
+    def __init__(self, cluster_path: str):
+        def load(name):
+            return np.load(os.path.join(cluster_path, name), mmap_mode='r')
+
+        self.long_sen_vector = load('long_sen_vector.npy')
+        self.sen_offsets = load('sen_offsets.npy')
+        if os.path.getsize(os.path.join(cluster_path, 'sentences.txt')):
+            text = np.memmap(os.path.join(cluster_path, 'sentences.txt'),
+                             dtype=np.uint8, mode='r')
+        else:
+            # an empty file can not be memory-mapped
+            text = np.zeros(0, dtype=np.uint8)
+        self.sentences = SentenceStore(text, load('text_offsets.npy'))
+        self.vocabulary = load_vocabulary(os.path.join(cluster_path,
+                                                       'words.txt'))
+        self.word_list = self.vocabulary.word_list
+        self.s_w_matrix = SentenceTermMatrix(
+            load('tf_idf_indptr.npy'), load('tf_idf_indices.npy'),
+            load('tf_idf_values.npy'), self.vocabulary.__len__(),
+            dtype=np.float64)
+
+    def doc_size(self):
+        return self.sen_offsets.__len__() - 1
+
+    def sen_size_total(self):
+        return int(self.sen_offsets[-1])
+
+    def abstract(self, sen_rank):
+        return self.sentences[sen_rank]
+
+
+# return the cached cluster in cache_path, or None if it is not cached
+def load_cluster(cache_path: str, key: str):
+    cluster_path = os.path.join(cache_path, key)
+    if not os.path.isdir(cluster_path):
+        return None
+    return CachedCluster(cluster_path)
+
+
+'''
+save the processed data of a cluster and its TF-IDF matrix, a sparse
+one such as the one of sparse_tf_idf, and vector. the files are written
+into a temporary directory first, which is then renamed, so that a
+half-written cluster is never loaded
+'''
+
+
+def save_cluster(cache_path: str, key: str, data, s_w_matrix,
+                 long_sen_vector: np.ndarray):
+    cluster_path = os.path.join(cache_path, key)
+    if os.path.isdir(cluster_path):
+        return
+    tmp_path = cluster_path + '.' + str(os.getpid()) + '.tmp'
+    os.makedirs(tmp_path, exist_ok=True)
+
+    np.save(os.path.join(tmp_path, 'tf_idf_indptr.npy'),
+            np.asarray(s_w_matrix.indptr, dtype=np.int64))
+    np.save(os.path.join(tmp_path, 'tf_idf_indices.npy'),
+            np.asarray(s_w_matrix.indices, dtype=np.int32))
+    np.save(os.path.join(tmp_path, 'tf_idf_values.npy'),
+            np.asarray(s_w_matrix.data, dtype=np.float64))
+    np.save(os.path.join(tmp_path, 'long_sen_vector.npy'), long_sen_vector)
+    np.save(os.path.join(tmp_path, 'sen_offsets.npy'),
+            np.asarray(data.sen_offsets, dtype=np.int64))
+    # the sentence buffer and its offsets are saved as they are
+    np.save(os.path.join(tmp_path, 'text_offsets.npy'),
+            np.asarray(data.sentences.offsets, dtype=np.int64))
+    outfile = open(os.path.join(tmp_path, 'sentences.txt'), 'wb')
+    outfile.write(data.sentences.buffer)
+    outfile.close()
+    data.vocabulary.save(os.path.join(tmp_path, 'words.txt'))
+
+    try:
+        os.rename(tmp_path, cluster_path)
+    except OSError:
+        # the cluster has been saved by another process at the same time
+        shutil.rmtree(tmp_path, ignore_errors=True)
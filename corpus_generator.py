@@ -0,0 +1,262 @@
+"""
+        Corpus Generator
+
+Generate synthetic clusters of documents in the format of the NYT
+documents in doc/unprocessed_data, i.e.
+
+ <DOC>
+ <DOCNO> NYT19981125.0417 </DOCNO>
+ <DOCTYPE> NEWS </DOCTYPE>
+ <TXTTYPE> NEWSWIRE </TXTTYPE>
+ <TEXT>
+ ... lines of sentences ending with '. ' ...
+ </TEXT>
+ </DOC>
+
+so that the summarization can be loaded with as many documents as
+wanted, without any real data.
+
+ words          the vocabulary is made of pseudo words, and the words of
+                the sentences are drawn from it by Zipf's law, i.e. the
+                r-th frequent word is drawn with the probability in
+                proportion to 1 / r ^ zipf
+ sentences      the number of words of a sentence is drawn from a
+                normal distribution, and so is the number of sentences
+                of a document
+ duplication    every sentence is a copy of an earlier sentence of the
+                cluster with the probability of the duplication rate,
+                as the news wires often repeat one another
+
+The same seed and arguments always generate the same corpus. Every
+cluster is a directory named as d90000t, d90001t ..., which can be
+summarized by batch_summarization.py.
+
+usage:
+
+ $ python3 corpus_generator.py doc/synthetic -c 10 -n 1000 --seed 7
+
+"""
+
+import argparse
+import datetime
+import os
+
+import numpy as np
+
+SEED = 0
+CLUSTERS = 1
+DOCUMENTS = 10
+# the first cluster is named d90000t
+FIRST_CLUSTER = 90000
+VOCABULARY_SIZE = 20000
+ZIPF = 1.1
+# the mean and the standard deviation of the words in a sentence
+SENTENCE_LENGTH = (20.0, 8.0)
+MIN_SENTENCE_LENGTH = 3
+# the mean and the standard deviation of the sentences in a document
+DOCUMENT_LENGTH = (30.0, 10.0)
+MIN_DOCUMENT_LENGTH = 1
+DUPLICATION_RATE = 0.05
+# the max characters of a line of the text
+LINE_WIDTH = 70
+
+SYLLABLES = ('ba', 'be', 'bi', 'bo', 'bu', 'ca', 'co', 'da', 'de', 'di',
+             'do', 'fa', 'fe', 'fi', 'ga', 'go', 'ha', 'he', 'hi', 'ka',
+             'ke', 'la', 'le', 'li', 'lo', 'lu', 'ma', 'me', 'mi', 'mo',
+             'na', 'ne', 'ni', 'no', 'pa', 'pe', 'pi', 'po', 'ra', 're',
+             'ri', 'ro', 'ru', 'sa', 'se', 'si', 'so', 'ta', 'te', 'ti',
+             'to', 'tu', 'va', 've', 'vi', 'wa', 'we', 'ya', 'za', 'zo',
+             'an', 'en', 'in', 'on', 'er', 'or', 'ar', 'ex', 'ing', 'ion')
+
+'''
+a vocabulary of `size` distinct pseudo words, which are made of
+syllables. the shorter words come first, so that the frequent words are
+short ones as in a natural language.
+'''
+
+
+def make_vocabulary(size: int, random: np.random.RandomState):
+    words = []
+    seen = set()
+    syllables = 1
+    while words.__len__() < size:
+        # try some more words of this number of syllables, and move on
+        # to longer ones when most of them are taken
+        tries = 0
+        while words.__len__() < size and tries < size:
+            picked = random.randint(0, SYLLABLES.__len__(), syllables)
+            word = ''.join(SYLLABLES[i] for i in picked)
+            tries += 1
+            if word not in seen:
+                seen.add(word)
+                words.append(word)
+            elif tries > 4 * SYLLABLES.__len__() ** syllables:
+                break
+        syllables += 1
+    return words
+
+
+'''
+a generator of synthetic clusters, each of which is a list of
+(docno, sentences) of its documents
+'''
+
+
+class CorpusGenerator:
+    def __init__(self, seed: int = SEED,
+                 vocabulary_size: int = VOCABULARY_SIZE,
+                 zipf: float = ZIPF,
+                 sentence_length: tuple = SENTENCE_LENGTH,
+                 document_length: tuple = DOCUMENT_LENGTH,
+                 duplication_rate: float = DUPLICATION_RATE):
+        self.random = np.random.RandomState(seed)
+        self.words = make_vocabulary(vocabulary_size, self.random)
+        # the cumulative probabilities of the words by Zipf's law
+        weights = 1.0 / np.arange(1, self.words.__len__() + 1) ** zipf
+        self.cdf = np.cumsum(weights / weights.sum())
+        self.sentence_length = sentence_length
+        self.document_length = document_length
+        self.duplication_rate = duplication_rate
+        # the date and the number of the next DOCNO
+        self.date = datetime.date(1998, 1, 1)
+        self.docno = 0
+
+    # draw n integers from the normal distribution (mean, sd)
+    def _lengths(self, n: int, distribution: tuple, minimum: int):
+        mean, sd = distribution
+        lengths = np.rint(self.random.normal(mean, sd, n)).astype(np.int64)
+        return np.maximum(lengths, minimum)
+
+    def _next_docno(self):
+        if self.docno == 10000:
+            self.date += datetime.timedelta(days=1)
+            self.docno = 0
+        docno = 'NYT' + self.date.strftime('%Y%m%d') + '.%04d' % self.docno
+        self.docno += 1
+        return docno
+
+    def sentences(self, n: int, earlier: list):
+        lengths = self._lengths(n, self.sentence_length, MIN_SENTENCE_LENGTH)
+        duplicated = self.random.random_sample(n) < self.duplication_rate
+        picked = np.searchsorted(self.cdf,
+                                 self.random.random_sample(lengths.sum()))
+        picked = np.minimum(picked, self.words.__len__() - 1)
+        sentences = []
+        begin = 0
+        for length, dup in zip(lengths, duplicated):
+            if dup and earlier:
+                sentences.append(earlier[self.random.randint(
+                    0, earlier.__len__())])
+            else:
+                words = [self.words[i] for i in picked[begin:begin + length]]
+                words[0] = words[0].capitalize()
+                sentences.append(' '.join(words))
+            begin += length
+        return sentences
+
+    # a cluster of n documents as a list of (docno, sentences)
+    def cluster(self, n: int):
+        documents = []
+        earlier = []
+        lengths = self._lengths(n, self.document_length, MIN_DOCUMENT_LENGTH)
+        for length in lengths:
+            sentences = self.sentences(int(length), earlier)
+            earlier.extend(sentences)
+            documents.append((self._next_docno(), sentences))
+        return documents
+
+
+'''
+the content of a document file. the sentences are joined by '. ' and
+wrapped into lines, each of which but the last one ends with a space,
+as the text of the NYT documents is.
+'''
+
+
+def format_document(docno: str, sentences: list):
+    lines = []
+    line = ''
+    for word in ('. '.join(sentences) + '.').split(' '):
+        if line and line.__len__() + word.__len__() >= LINE_WIDTH:
+            lines.append(line + ' ')
+            line = word
+        else:
+            line = line + ' ' + word if line else word
+    lines.append(line)
+    return ('<DOC>\n'
+            '<DOCNO> ' + docno + ' </DOCNO>\n'
+            '<DOCTYPE> NEWS </DOCTYPE>\n'
+            '<TXTTYPE> NEWSWIRE </TXTTYPE>\n'
+            '<TEXT>\n' + '\n'.join(lines) + '\n</TEXT>\n'
+            '</DOC>\n')
+
+
+'''
+write `clusters` clusters of `documents` documents into root, one
+directory per cluster and one file per document named after its DOCNO.
+return a list of (cluster, doc_path, doc_list) as find_clusters of
+batch_summarization does.
+'''
+
+
+def generate_corpus(root: str, clusters: int = CLUSTERS,
+                    documents: int = DOCUMENTS,
+                    generator: CorpusGenerator = None):
+    if generator is None:
+        generator = CorpusGenerator()
+    corpus = []
+    for c in range(clusters):
+        cluster = 'd' + str(FIRST_CLUSTER + c) + 't'
+        doc_path = os.path.join(root, cluster, '')
+        os.makedirs(doc_path, exist_ok=True)
+        doc_list = []
+        for docno, sentences in generator.cluster(documents):
+            outfile = open(doc_path + docno, 'w')
+            outfile.write(format_document(docno, sentences))
+            outfile.close()
+            doc_list.append(docno)
+        corpus.append((cluster, doc_path, tuple(doc_list)))
+    return corpus
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='generate synthetic clusters of NYT-like documents')
+    parser.add_argument('root', help='directory of the clusters')
+    parser.add_argument('-c', '--clusters', type=int, default=CLUSTERS,
+                        help='number of clusters')
+    parser.add_argument('-n', '--documents', type=int, default=DOCUMENTS,
+                        help='number of documents per cluster')
+    parser.add_argument('--seed', type=int, default=SEED,
+                        help='seed of the random numbers')
+    parser.add_argument('--vocabulary', type=int, default=VOCABULARY_SIZE,
+                        help='number of distinct words')
+    parser.add_argument('--zipf', type=float, default=ZIPF,
+                        help='exponent of the Zipf distribution of words')
+    parser.add_argument('--sentence-length', type=float, nargs=2,
+                        default=SENTENCE_LENGTH, metavar=('MEAN', 'SD'),
+                        help='words per sentence')
+    parser.add_argument('--document-length', type=float, nargs=2,
+                        default=DOCUMENT_LENGTH, metavar=('MEAN', 'SD'),
+                        help='sentences per document')
+    parser.add_argument('--duplication', type=float,
+                        default=DUPLICATION_RATE,
+                        help='rate of sentences copied from earlier ones')
+    args = parser.parse_args()
+
+    generator = CorpusGenerator(args.seed, args.vocabulary, args.zipf,
+                                tuple(args.sentence_length),
+                                tuple(args.document_length),
+                                args.duplication)
+    corpus = generate_corpus(args.root, args.clusters, args.documents,
+                             generator)
+    print('%d clusters of %d documents are generated in %s'
+          % (corpus.__len__(), args.documents, args.root))
+
+
+'''
+//  main  //
+'''
+
+if __name__ == '__main__':
+    main()
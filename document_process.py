@@ -8,12 +8,11 @@ The necessary components are
  (a) Original sentences which classified by documents,
  (b) Stop-word-free and stemmed sentences which signed
   with index ordered by where the original sentences is,
- (c) A dictionary where the unique words appeared in all
-  of the documents which are regarded as keys, which
-  indicated by the key is a numpy-array-based list.
-  For one of that lists, the indexes relate to document's
-  ones as well as elements are arrays of the counts of
-  word ordered by sentence indexes.
+ (c) A sparse sentence-word matrix, whose rows are the
+  sentences of all of the documents in order and whose
+  columns are the unique words appeared in them. Only the
+  non-zero counts are stored, so the memory grows with the
+  number of (sentence, word) pairs instead of words x sentences.
 
 However, it is easy for using to define the components
 mentioned above as public ones.
@@ -30,24 +29,42 @@ data structure
    ... | [ ... ]
    docn] [ ... , senm]
 
- word_counter : q(wrd)
-       { 'wrd0' : [ value_list0 ]
-       | 'wrd1' : [ value_list1 ]
-       |   ...  :      ...
-       } 'wrdq' : [ value_listq ]
+ sentences : the original sentences of all docs in one buffer
+   buffer  b'sen1sen2sen3...senm'   (utf-8)
+   offsets [ 0, e1, e2, ... , size ] (sentence r is buffer[offsets[r]:offsets[r+1]])
 
- value_list - for word_counter : n(doc) x m(sen) (sen = {int})
-   doc0[ [sen1, sen2, sen3, ... ,senk],
-   doc1| [sen(k+1), sen(k+2), ... ]
-   ... | [ ... ]
-   docn] [ ... , senm]
+ word_list : q(wrd)
+   [ 'wrd0', 'wrd1', ... , 'wrdq' ] (column index = word index)
+
+ term_matrix : (total sentences) x q(wrd), CSR
+   indptr  [ 0, e1, e2, ... , nnz ]   (row r owns entries indptr[r]:indptr[r+1])
+   indices [ wrd index of each entry ]
+   data    [ count of each entry ]
+
+ sen_offsets : n(doc) + 1
+   [ 0, k, ... , m ]   (row of the first sentence of each doc)
+
+ sen_lengths : (total sentences), doc_lengths : n(doc)
+   [ words of sen1, ... ], [ words of doc0, ... ]
+
+ sen_freq, doc_freq, word_totals : q(wrd)
+   [ sentences / docs containing wrd0, times wrd0 appears, ... ]
 
 """
 
+import os
+from array import array
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import instrument
+import numpy as np
 from poter_stemming import PorterStemmer
 
 REFERENCE_PATH = ''
 STOP_WORD_LIST = 'stop-word-list.csv'
+# how many words the stem cache keeps
+STEM_CACHE_SIZE = 100000
 
 '''
 Split text in the document into sentences.return a list, which contains sub-lists 
@@ -59,72 +76,286 @@ too.
 
 
 def split_sentences(path: str, documents: tuple):
-    doc = []
-    # transverse every document
-    for f in documents:
-        # open the current document
-        infile = open(path + f, 'r')
-        str_text = ''
-        # skip line until the text start signal has been read
-        while infile.readline() != '<TEXT>\n':
-            continue
-        # store all text sentences without '\n' into sentences
-        while True:
-            line = infile.readline()
-            if line != '</TEXT>\n':
-                str_text += line[:-1]  # the last char is always '\n'
-            else:
-                break
-        sentences = str_text.split('. ')
-        # if the last sentence is empty string, abandon it
-        if sentences[-1] == '':
-            sentences = sentences[:-1]
-        doc.append(sentences)
-        infile.close()
+    doc = [[] for f in documents]
+    for doc_idx, sen_idx, sentence in iter_sentences(path, documents):
+        doc[doc_idx].append(sentence)
     return doc
 
 
 '''
-delete stop word in sentence as well as transform the sentence into 
-lower case 
+split the content of a document file into sentences. the text is the
+lines between the line '<TEXT>' and the line '</TEXT>', which are
+joined without '\n'.
 '''
 
 
-def delete_stop_words(ori_sen: str):
-    # for identifying the real stop word
-    # from sub-string in a word which is as same
-    # as some stop word, it is more simple to add
-    # space in the front and at the end of the sentence,
-    # while using ' ' + word + ' ' to identify the stop
-    # word
-    sentence = ' ' + ori_sen.lower() + ' '
-    # read stop word list in file
-    infile = open(REFERENCE_PATH + STOP_WORD_LIST)
+def text_sentences(content: str):
+    # skip until the text start signal
+    if content.startswith('<TEXT>\n'):
+        begin = '<TEXT>\n'.__len__()
+    else:
+        begin = content.index('\n<TEXT>\n') + '\n<TEXT>\n'.__len__()
+    # the text ends before the first line of the text end signal
+    end = content.index('\n</TEXT>\n', begin - 1) + 1
+    str_text = content[begin:end].replace('\n', '')
+    sentences = str_text.split('. ')
+    # if the last sentence is empty string, abandon it
+    if sentences[-1] == '':
+        sentences = sentences[:-1]
+    return sentences
+
+
+# read the whole document file at once
+def read_content(file_name: str):
+    infile = open(file_name, 'r')
+    content = infile.read()
+    infile.close()
+    return content
+
+
+def read_sentences(file_name: str):
+    return text_sentences(read_content(file_name))
+
+
+'''
+a generator of (doc index, sentence index, sentence) of all of the
+sentences in the documents in order. the sentences of a document are
+given as soon as it has been read, while the next document is being
+read in the background. if the contents of the document files have
+been read already, they are split instead of the files.
+'''
+
+
+def iter_sentences(path: str, documents: tuple, contents: list = None):
+    if contents is not None:
+        for doc_idx, content in enumerate(contents):
+            for sen_idx, sentence in enumerate(text_sentences(content)):
+                yield doc_idx, sen_idx, sentence
+        return
+    if not documents:
+        return
+    reader = ThreadPoolExecutor(max_workers=1)
+    try:
+        next_doc = reader.submit(read_sentences, path + documents[0])
+        for doc_idx in range(documents.__len__()):
+            sentences = next_doc.result()
+            if doc_idx + 1 < documents.__len__():
+                next_doc = reader.submit(read_sentences,
+                                         path + documents[doc_idx + 1])
+            for sen_idx, sentence in enumerate(sentences):
+                yield doc_idx, sen_idx, sentence
+    finally:
+        reader.shutdown(wait=True)
+
+
+'''
+a set of stop words, which is loaded from a list file only once.
+the list file is a comma separated one such as STOP_WORD_LIST.
+'''
+
+
+class StopWordFilter:
+    def __init__(self, words):
+        self.words = frozenset(w.lower() for w in words)
+
+    def __contains__(self, word):
+        return word in self.words
+
+    def __len__(self):
+        return self.words.__len__()
+
+    # delete stop words in the sentence as well as transform it
+    # into lower case. the sentence is split by ' ' only once and
+    # the words, except the stop words, are joined again, so that
+    # some characters in a word which has a sub-string as same as
+    # a stop word are never deleted
+    def filter(self, sentence: str):
+        return ' '.join(w for w in sentence.lower().split(' ')
+                        if w not in self.words)
+
+
+def read_stop_word_list(path: str):
+    infile = open(path)
     # read and transform into lower case
     lines = infile.read().lower()
-    stop_word_list = lines.split(', ')
-    # splitting into words is to avoid form deleting some
-    # characters in a certain word which has a sub-string
-    # containing the stop word
-    words = sentence.split(' ')
-    for w in words:
-        if w in stop_word_list:
-            sentence = sentence.replace(' ' + w + ' ', ' ')
-        else:
-            continue
-    # remove the spaces in the beginning and at the end,
-    # which were added in the beginning of this method
-    return sentence[1:-1]
+    infile.close()
+    return StopWordFilter(lines.split(', '))
 
 
+# the shared filters, keyed by (path, mtime) of their list files
+_stop_word_filters = {}
+
+'''
+return the stop word filter of the list file in path, the file is
+read only once in a process unless it is modified. the default one
+is REFERENCE_PATH + STOP_WORD_LIST.
 '''
-use class PorterStemmer written by Porter
+
+
+def load_stop_words(path: str = None):
+    if path is None:
+        path = REFERENCE_PATH + STOP_WORD_LIST
+    path = os.path.abspath(path)
+    key = (path, os.path.getmtime(path))
+    if key not in _stop_word_filters:
+        # forget the filters of the older versions of the file
+        for k in [k for k in _stop_word_filters if k[0] == path]:
+            del _stop_word_filters[k]
+        _stop_word_filters[key] = read_stop_word_list(path)
+    return _stop_word_filters[key]
+
+
+'''
+delete stop word in sentence as well as transform the sentence into 
+lower case. stop_words is a StopWordFilter or the path of a stop word
+list file, the default list is used if it is None
+'''
+
+
+def delete_stop_words(ori_sen: str, stop_words=None):
+    if not isinstance(stop_words, StopWordFilter):
+        stop_words = load_stop_words(stop_words)
+    return stop_words.filter(ori_sen)
+
+
+'''
+class PorterStemmer written by Porter with a bounded LRU cache of
+word -> stem, for the same words are stemmed again and again in the
+news documents. the hits and misses of the cache are counted to size
+it. the cache can be saved to and loaded from a table file, whose
+lines are 'word stem', or just 'word' if the word is its own stem.
+the words are in the least recently used first order. the stemmer of a
+worker process reports its new stems and counts, which are merged into
+the stemmer of the parent process, so that they can be saved there.
+'''
+
+
+class CachedStemmer:
+    def __init__(self, max_size: int = STEM_CACHE_SIZE, path: str = None):
+        self.stemmer = PorterStemmer()
+        self.cache = OrderedDict()
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        # the (word, stem) pairs stemmed since the last report, which
+        # are recorded only after the first report
+        self.journal = None
+        self.reported = (0, 0)
+        if path is not None and os.path.exists(path):
+            self.load(path)
+
+    # NOTE that only lower case words are stemmed correctly
+    def stem(self, word: str):
+        stem = self.cache.get(word)
+        if stem is not None:
+            self.hits += 1
+            self.cache.move_to_end(word)
+            return stem
+        self.misses += 1
+        stem = self.stemmer.stem(word, 0, len(word) - 1)
+        self.cache[word] = stem
+        if self.journal is not None:
+            self.journal.append((word, stem))
+        if self.cache.__len__() > self.max_size:
+            self.cache.popitem(last=False)
+        return stem
+
+    def info(self):
+        return {'hits': self.hits, 'misses': self.misses,
+                'size': self.cache.__len__(), 'max_size': self.max_size}
+
+    # add the (word, stem) pairs as the most recently used ones
+    def update(self, pairs):
+        for word, stem in pairs:
+            self.cache[word] = stem
+            self.cache.move_to_end(word)
+        while self.cache.__len__() > self.max_size:
+            self.cache.popitem(last=False)
+
+    # return the new pairs, hits and misses since the last report, so
+    # that the stems learned in a worker process can be sent back and
+    # merged into the stemmer of the parent process
+    def report(self):
+        pairs = self.journal if self.journal is not None else []
+        hits = self.hits - self.reported[0]
+        misses = self.misses - self.reported[1]
+        self.journal = []
+        self.reported = (self.hits, self.misses)
+        return pairs, hits, misses
+
+    def merge(self, report):
+        pairs, hits, misses = report
+        self.update(pairs)
+        self.hits += hits
+        self.misses += misses
+
+    def load(self, path: str):
+        infile = open(path, 'r')
+        # a line is 'word stem', or 'word' if the word is its own stem
+        self.update((pair[0], pair[-1])
+                    for pair in (line.split() for line in infile) if pair)
+        infile.close()
+
+    def save(self, path: str):
+        # write a temporary file first, so that the workers reading
+        # the table never see a half-written one
+        outfile = open(path + '.tmp', 'w')
+        for word, stem in self.cache.items():
+            if word == stem:
+                outfile.write(word + '\n')
+            else:
+                outfile.write(word + ' ' + stem + '\n')
+        outfile.close()
+        os.replace(path + '.tmp', path)
+
+
+# the stemmer shared by all documents in the process, and the stem
+# cache tables loaded into it
+_shared_stemmer = None
+_loaded_stem_tables = set()
+
+'''
+return the stemmer shared in the process. if a path of a stem cache
+table is given, the table is loaded into the shared stemmer if it has
+not been loaded yet.
+'''
+
+
+def get_stemmer(path: str = None):
+    global _shared_stemmer
+    if _shared_stemmer is None:
+        _shared_stemmer = CachedStemmer()
+    if path is not None and path not in _loaded_stem_tables:
+        if os.path.exists(path):
+            _shared_stemmer.load(path)
+        _loaded_stem_tables.add(path)
+    return _shared_stemmer
+
+
+'''
+the initializer of a worker process: load the stem cache table into the
+shared stemmer of the worker, as well as the (word, stem) pairs given
+by the parent process, so that the worker does not start cold. the new
+stems of the worker are recorded from now on, to be reported back.
+'''
+
+
+def init_stem_worker(path: str = None, pairs: list = ()):
+    stemmer = get_stemmer(path)
+    stemmer.update(pairs)
+    stemmer.report()
+
+
+'''
+stem the words in the sentences with a CachedStemmer, the shared one
+is used if stemmer is None.
 return a list of stemmed sentences 
 '''
 
 
-def porter_stemming(sentences: list):
-    p = PorterStemmer()
+def porter_stemming(sentences: list, stemmer: CachedStemmer = None):
+    if stemmer is None:
+        stemmer = get_stemmer()
     new_sentences = []
     for s in sentences:
         output = ''
@@ -134,7 +365,7 @@ def porter_stemming(sentences: list):
                 word += c.lower()
             else:
                 if word:
-                    output += p.stem(word, 0, len(word) - 1)
+                    output += stemmer.stem(word)
                     word = ''
                 output += c.lower()
         new_sentences.append(output)
@@ -159,163 +390,666 @@ def count_word(sentence: str):
     return counter_in_sen
 
 
-class WordCounter:
-    def __init__(self):
-        self.cntr = {}
+'''
+a vocabulary of the unique words, where every word is interned with an
+integer index in the order it was added, i.e.
+ word_index : { 'wrd0' : 0, 'wrd1' : 1, ... }
+ word_list  : [ 'wrd0', 'wrd1', ... ]
+it can be saved into a file, one word per line, and loaded in another
+run so that the words keep their indexes.
+'''
+
+
+class Vocabulary:
+    def __init__(self, words=()):
+        # word -> word index
+        self.word_index = {}
+        # word index -> word
+        self.word_list = []
+        for w in words:
+            self.add(w)
+
+    def __len__(self):
+        return self.word_list.__len__()
+
+    def __contains__(self, word):
+        return word in self.word_index
+
+    # the index of the word, -1 if there is no such word
+    def get(self, word: str):
+        return self.word_index.get(word, -1)
+
+    # the index of the word, a new one if the word is unseen
+    def add(self, word: str):
+        idx = self.word_index.get(word)
+        if idx is None:
+            idx = self.word_list.__len__()
+            self.word_index[word] = idx
+            self.word_list.append(word)
+        return idx
+
+    def copy(self):
+        return Vocabulary(self.word_list)
+
+    # keep the words whose element in the boolean array remained is
+    # True, and renumber them in order
+    def compact(self, remained):
+        self.word_list[:] = [w for w, r in zip(self.word_list, remained) if r]
+        self.word_index.clear()
+        for idx, w in enumerate(self.word_list):
+            self.word_index[w] = idx
+
+    def save(self, path: str):
+        outfile = open(path, 'w', encoding='utf-8')
+        for w in self.word_list:
+            outfile.write(w + '\n')
+        outfile.close()
+
 
-    def generate_value_list(self, doc: list, word: str):
-        ori_cnt_lst = []
-        for d in doc:
-            counter_in_sen = [0 for i in range(d.__len__())]
-            ori_cnt_lst.append(counter_in_sen)
-        self.cntr[word] = ori_cnt_lst
+def load_vocabulary(path: str):
+    infile = open(path, 'r', encoding='utf-8')
+    words = infile.read().split('\n')[:-1]
+    infile.close()
+    return Vocabulary(words)
+
+
+'''
+a tokenizer doing all of the above in a single pass over a sentence:
+it transforms the sentence into lower case, splits it into words,
+deletes the stop words, stems the remained words and maps the stems
+to word indexes, which are new ones added to the vocabulary if the
+stems have not been seen before. the result is as same as
+count_word(porter_stemming([delete_stop_words(s)])[0]), i.e.
+ - a word is a run of letters,
+ - the last word is dropped if nothing follows it in the sentence,
+ - a stem of only one letter is joined to the next stem.
+'''
+
+
+class Tokenizer:
+    def __init__(self, stop_words: StopWordFilter = None,
+                 stemmer: CachedStemmer = None,
+                 vocabulary: Vocabulary = None):
+        self.stop_words = stop_words if stop_words is not None \
+            else load_stop_words()
+        self.stemmer = stemmer if stemmer is not None else get_stemmer()
+        self.vocabulary = vocabulary if vocabulary is not None \
+            else Vocabulary()
+
+    # the words of the sentence, as the runs of letters of the
+    # stop-word-free and lower case sentence, in order
+    def _runs(self, sentence: str):
+        runs = []
+        word = ''
+        for w in sentence.lower().split(' '):
+            if w in self.stop_words:
+                continue
+            # a space is between every two remained words
+            if word:
+                runs.append(word)
+                word = ''
+            if w.isalpha():
+                word = w
+                continue
+            for c in w:
+                if c.isalpha():
+                    word += c
+                elif word:
+                    runs.append(word)
+                    word = ''
+        # the last word is dropped if the sentence ends with it
+        return runs
+
+    # the stemmed words of the sentence, in order
+    def terms(self, sentence: str):
+        terms = []
+        w = ''
+        for run in self._runs(sentence):
+            w += self.stemmer.stem(run)
+            if w.__len__() > 1:
+                terms.append(w)
+                w = ''
+        return terms
+
+    # the word indexes of the stemmed words of the sentence, in order
+    def tokenize(self, sentence: str):
+        add = self.vocabulary.add
+        return array('i', [add(w) for w in self.terms(sentence)])
+
+
+'''
+process one document in a worker process of DocProcess: split it into
+sentences and tokenize them with word indexes local to the document.
+return the sentences, the local word list, the arrays of the local
+word indexes and the report of the new stems. the shared stemmer of the
+worker process is used. the file is read only if its content is not
+given.
+'''
+
+
+def tokenize_document(file_name: str, stop_words: StopWordFilter,
+                      content: str = None):
+    stemmer = get_stemmer()
+    tokenizer = Tokenizer(stop_words, stemmer)
+    if content is None:
+        content = read_content(file_name)
+    sentences = text_sentences(content)
+    pro_doc = [tokenizer.tokenize(s) for s in sentences]
+    return sentences, tokenizer.vocabulary.word_list, pro_doc, \
+        stemmer.report()
+
+
+'''
+a compressed sparse row (CSR) matrix whose rows are sentences in
+multi-doc scope and whose columns are words. only the non-zero
+counts are stored:
+ indptr  - row r owns the entries indptr[r]:indptr[r + 1]
+ indices - the column (word index) of every entry, ascending in a row
+ data    - the count of every entry, or another value of dtype such as
+           the TF-IDF value
+a column-oriented copy (CSC) of the same entries is built once as well,
+so that the per-word accessors do not need to scan every row.
+'''
+
+
+class SentenceTermMatrix:
+    def __init__(self, indptr, indices, data, col_size: int,
+                 dtype=np.int32):
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int32)
+        self.data = np.asarray(data, dtype=dtype)
+        self.shape = (self.indptr.__len__() - 1, col_size)
+        # column-oriented view, rows are ascending in every column.
+        # it is built when a column is needed for the first time
+        # after the matrix has changed
+        self.col_ptr = None
+        self.col_rows = None
+        self.col_data = None
+
+    def _build_columns(self):
+        order = np.argsort(self.indices, kind='stable')
+        self.col_ptr = np.zeros(self.shape[1] + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.indices, minlength=self.shape[1]),
+                  out=self.col_ptr[1:])
+        self.col_rows = self.row_of_entries()[order]
+        self.col_data = self.data[order]
+
+    def _changed(self, row_size, col_size):
+        self.shape = (row_size, col_size)
+        self.col_ptr = self.col_rows = self.col_data = None
+
+    def nnz(self):
+        return self.data.__len__()
+
+    # the row of every stored entry
+    def row_of_entries(self):
+        return np.repeat(np.arange(self.shape[0], dtype=np.int64),
+                         np.diff(self.indptr))
+
+    # the count at (row, col), 0 if the entry is not stored
+    def count(self, row, col):
+        begin, end = self.indptr[row], self.indptr[row + 1]
+        pos = begin + np.searchsorted(self.indices[begin:end], col)
+        if pos < end and self.indices[pos] == col:
+            return int(self.data[pos])
+        return 0
+
+    # the sum of the counts in rows [row_begin, row_end)
+    def row_range_sum(self, row_begin, row_end):
+        return int(self.data[self.indptr[row_begin]:self.indptr[row_end]].sum())
+
+    # the rows in which the column is non-zero, and the counts there
+    def column(self, col):
+        if self.col_ptr is None:
+            self._build_columns()
+        begin, end = self.col_ptr[col], self.col_ptr[col + 1]
+        return self.col_rows[begin:end], self.col_data[begin:end]
+
+    # append rows given as a CSR matrix of their own, with col_size
+    # columns which can be more than the ones of this matrix
+    def append_rows(self, indptr, indices, data, col_size: int):
+        indptr = np.asarray(indptr, dtype=np.int64)
+        self.indptr = np.concatenate((self.indptr,
+                                      indptr[1:] + self.indptr[-1]))
+        self.indices = np.concatenate((self.indices,
+                                       np.asarray(indices, dtype=np.int32)))
+        self.data = np.concatenate((self.data,
+                                    np.asarray(data, dtype=self.data.dtype)))
+        self._changed(self.indptr.__len__() - 1, col_size)
+
+    # delete the rows [row_begin, row_end)
+    def delete_rows(self, row_begin, row_end):
+        begin, end = self.indptr[row_begin], self.indptr[row_end]
+        self.indptr = np.concatenate((self.indptr[:row_begin],
+                                      self.indptr[row_end:] - (end - begin)))
+        self.indices = np.concatenate((self.indices[:begin],
+                                       self.indices[end:]))
+        self.data = np.concatenate((self.data[:begin], self.data[end:]))
+        self._changed(self.indptr.__len__() - 1, self.shape[1])
+
+    # renumber the columns by col_map, an ascending array of the new
+    # column of every old one, so the columns remain ascending in rows
+    def remap_columns(self, col_map, col_size: int):
+        self.indices = np.asarray(col_map, dtype=np.int32)[self.indices]
+        self._changed(self.shape[0], col_size)
+
+    # the sum of every row in [row_begin, row_end), as integers
+    def row_sums(self, row_begin=0, row_end=None):
+        if row_end is None:
+            row_end = self.shape[0]
+        entry_begin = self.indptr[row_begin]
+        entries = self.data[entry_begin:self.indptr[row_end]]
+        sums = np.zeros(entries.__len__() + 1, dtype=np.int64)
+        np.cumsum(entries, out=sums[1:])
+        return np.diff(sums[self.indptr[row_begin:row_end + 1] - entry_begin])
+
+    # the sum of every column of the entries in [entry_begin, entry_end)
+    def column_sums(self, entry_begin=0, entry_end=None):
+        return np.bincount(self.indices[entry_begin:entry_end],
+                           weights=self.data[entry_begin:entry_end],
+                           minlength=self.shape[1]).astype(np.int64)
+
+    def to_dense(self, dtype=np.float64):
+        dense = np.zeros(self.shape, dtype=dtype)
+        dense[self.row_of_entries(), self.indices] = self.data
+        return dense
+
+
+'''
+the original sentences of all of the documents in order, stored in one
+utf-8 buffer with the byte offset of every sentence, instead of one
+string object per sentence. a sentence is a slice of the buffer, which
+is decoded when it is accessed. the buffer can be a bytearray, which
+sentences can be appended to, or a read-only one such as a memory-mapped
+array of uint8.
+'''
+
+
+class SentenceStore:
+    def __init__(self, buffer=None, offsets=None):
+        self.buffer = bytearray() if buffer is None else buffer
+        self.offsets = array('q', [0]) if offsets is None else offsets
+
+    def __len__(self):
+        return self.offsets.__len__() - 1
+
+    def __getitem__(self, row):
+        return bytes(self.buffer[self.offsets[row]:self.offsets[row + 1]]) \
+            .decode('utf-8')
+
+    def append(self, sentence: str):
+        self.buffer.extend(sentence.encode('utf-8'))
+        self.offsets.append(self.buffer.__len__())
+
+    def extend(self, sentences):
+        for s in sentences:
+            self.append(s)
+
+    # the sentences of the rows in [row_begin, row_end)
+    def slice(self, row_begin, row_end):
+        return [self[r] for r in range(row_begin, row_end)]
+
+    def delete(self, row_begin, row_end):
+        begin, end = self.offsets[row_begin], self.offsets[row_end]
+        del self.buffer[begin:end]
+        self.offsets = self.offsets[:row_begin + 1] + array(
+            'q', [o - (end - begin) for o in self.offsets[row_end + 1:]])
 
 
 class DocProcess:
 
-    def __init__(self, doc_path: str, doc_list: tuple):
-        # a list to store all sentences in every document
-        self.ori_doc = []
+    def __init__(self, doc_path: str, doc_list: tuple, stop_words=None,
+                 stemmer: CachedStemmer = None, workers: int = 1,
+                 contents: list = None, vocabulary: Vocabulary = None):
+        # all sentences of every document in one buffer, the sentences
+        # of a document are given by ori_doc
+        self.sentences = SentenceStore()
 
         # a list of Stop-word-free and stemmed sentences which signed
         # with index ordered by where the original sentences is,
+        # every sentence is an array of the indexes of its words
         self.processed_doc = []
 
-        # a list of unique words
-        self.word_list = []
+        # the unique words, whose indexes are the columns of term_matrix.
+        # if a vocabulary is given, e.g. one saved in another run, its
+        # words keep their indexes and new words are added after them
+        self.vocabulary = vocabulary.copy() if vocabulary is not None \
+            else Vocabulary()
+
+        # the index of the first sentence of every doc in multi-doc
+        # scope, the last element is the number of all sentences
+        self.sen_offsets = None
+
+        # sparse sentence-word count matrix
+        self.term_matrix = None
+
+        # how many sentences, and how many docs, contain every word
+        self.sen_freq = None
+        self.doc_freq = None
+
+        # the number of words of every sentence (row) and every doc,
+        # how many times every word appears in all docs, and the number
+        # of words in all docs. they are kept up to date when documents
+        # are added or removed, so the sizes are looked up in O(1)
+        self.sen_lengths = None
+        self.doc_lengths = None
+        self.word_totals = None
+        self.word_total = 0
+
+        # the stop words of this run, a StopWordFilter or the path of
+        # a stop word list file, the default list is used if it is None
+        if not isinstance(stop_words, StopWordFilter):
+            stop_words = load_stop_words(stop_words)
+        self.stop_words = stop_words
+
+        # the stemmer of this run, the shared one is used if it is None
+        if stemmer is None:
+            stemmer = get_stemmer()
+        self.stemmer = stemmer
+
+        # split text in doc into sentences, delete stop words, stem
+        # remained words and map them to word indexes. the arrays of
+        # the indexes are stored in processed_doc and counted at once,
+        # one row of the sparse matrix per sentence. a word is counted
+        # once in every sentence containing it. if the contents of the
+        # document files are given, they are used instead of reading
+        # doc_path + doc_list
+        tokenizer = Tokenizer(self.stop_words, self.stemmer,
+                              self.vocabulary)
+        self.processed_doc = [[] for f in doc_list]
+        indptr = [0]
+        indices = array('i')
+
+        def add_sentence(doc_idx, s, sen):
+            self.sentences.append(s)
+            self.processed_doc[doc_idx].append(sen)
+            indices.extend(sorted(set(sen)))
+            indptr.append(indices.__len__())
+
+        with instrument.stage('tokenize', documents=doc_list.__len__(),
+                              workers=workers):
+            if workers > 1:
+                # the documents are processed by a pool of worker processes
+                # with their own word indexes, which are mapped to the ones
+                # of the vocabulary document by document in order. so the
+                # result is as same as the one processed serially. the
+                # workers start with the stems of this run's stemmer, and
+                # the stems they learn are merged back into it
+                pool = ProcessPoolExecutor(
+                    max_workers=workers, initializer=init_stem_worker,
+                    initargs=(None, list(self.stemmer.cache.items())))
+                try:
+                    if contents is None:
+                        contents = [None] * doc_list.__len__()
+                    docs = pool.map(tokenize_document,
+                                    [doc_path + f for f in doc_list],
+                                    [self.stop_words] * doc_list.__len__(),
+                                    contents)
+                    for doc_idx, (sentences, words, pro_doc, stems) \
+                            in enumerate(docs):
+                        self.stemmer.merge(stems)
+                        word_ids = np.array(
+                            [self.vocabulary.add(w) for w in words],
+                            dtype=np.int32)
+                        for s, sen in zip(sentences, pro_doc):
+                            sen = word_ids[np.frombuffer(sen, dtype=np.int32)]
+                            add_sentence(doc_idx, s, array('i', sen.tobytes()))
+                finally:
+                    pool.shutdown(wait=True)
+            else:
+                for doc_idx, sen_idx, s in iter_sentences(doc_path, doc_list,
+                                                          contents):
+                    add_sentence(doc_idx, s, tokenizer.tokenize(s))
+        with instrument.stage('term_matrix'):
+            self.term_matrix = SentenceTermMatrix(
+                indptr, indices, np.ones(indices.__len__(), dtype=np.int32),
+                self.vocabulary.__len__())
+            self.sen_offsets = np.zeros(self.doc_size() + 1, dtype=np.int64)
+            np.cumsum([doc.__len__() for doc in self.processed_doc],
+                      out=self.sen_offsets[1:])
+            self._count_frequencies()
+        if instrument.is_enabled():
+            instrument.event('documents', documents=self.doc_size(),
+                             sentences=self.sen_size_total(),
+                             words=self.vocabulary.__len__(),
+                             entries=self.term_matrix.nnz())
+
+    '''
+    add a document to the end of the documents. only the new document
+    is processed, while the word list, the count matrix, the sentence
+    offsets and the frequencies are updated in place. the file is read
+    only if its content is not given.
+    '''
+
+    def add_document(self, file_name: str, content: str = None):
+        if content is None:
+            content = read_content(file_name)
+        tokenizer = Tokenizer(self.stop_words, self.stemmer,
+                              self.vocabulary)
+        sentences = text_sentences(content)
+        pro_doc = [tokenizer.tokenize(s) for s in sentences]
+        indptr = [0]
+        indices = array('i')
+        for sen in pro_doc:
+            indices.extend(sorted(set(sen)))
+            indptr.append(indices.__len__())
+        word_size = self.vocabulary.__len__()
+        row_begin = self.term_matrix.shape[0]
+        entry_begin = self.term_matrix.nnz()
+        self.term_matrix.append_rows(
+            indptr, indices, np.ones(indices.__len__(), dtype=np.int32),
+            word_size)
+        self.sentences.extend(sentences)
+        self.processed_doc.append(pro_doc)
+        self.sen_offsets = np.append(self.sen_offsets,
+                                     self.sen_offsets[-1] + len(sentences))
+
+        sen_freq = np.bincount(np.asarray(indices, dtype=np.int32),
+                               minlength=word_size)
+        self.sen_freq = np.append(
+            self.sen_freq, np.zeros(word_size - self.sen_freq.__len__(),
+                                    dtype=self.sen_freq.dtype)) + sen_freq
+        self.doc_freq = np.append(
+            self.doc_freq, np.zeros(word_size - self.doc_freq.__len__(),
+                                    dtype=self.doc_freq.dtype)) + (sen_freq > 0)
+
+        sen_lengths = self.term_matrix.row_sums(row_begin)
+        self.sen_lengths = np.append(self.sen_lengths, sen_lengths)
+        self.doc_lengths = np.append(self.doc_lengths, sen_lengths.sum())
+        self.word_totals = np.append(
+            self.word_totals, np.zeros(word_size - self.word_totals.__len__(),
+                                       dtype=np.int64)) \
+            + self.term_matrix.column_sums(entry_begin)
+        self.word_total += int(sen_lengths.sum())
 
-        # a dictionary of the count of appeared words
-        self.word_counter = WordCounter()
-
-        # split text in doc into sentences
-        self.ori_doc = split_sentences(path=doc_path, documents=doc_list)
-        # delete stop words and stem remained words
-        # store the processed data in processed_doc
-        for old_doc in self.ori_doc:
-            new_doc = []
-            for s in old_doc:
-                new_doc.append(delete_stop_words(s))
-            new_doc = porter_stemming(new_doc)
-            self.processed_doc.append(new_doc)
-
-        # count words
-        doc_idx = 0
+    '''
+    remove the document doc[doc_index]. the words which are not in any
+    other document are removed from the vocabulary, and the remained
+    words are renumbered in their order in the vocabulary.
+    '''
+
+    def remove_document(self, doc_index):
+        row_begin = int(self.sen_offsets[doc_index])
+        row_end = int(self.sen_offsets[doc_index + 1])
+        indices = self.term_matrix.indices[
+            self.term_matrix.indptr[row_begin]:self.term_matrix.indptr[row_end]]
+        sen_freq = np.bincount(indices, minlength=self.vocabulary.__len__())
+        self.sen_freq = self.sen_freq - sen_freq
+        self.doc_freq = self.doc_freq - (sen_freq > 0)
+        self.word_totals = self.word_totals - self.term_matrix.column_sums(
+            self.term_matrix.indptr[row_begin], self.term_matrix.indptr[row_end])
+        self.word_total -= int(self.doc_lengths[doc_index])
+        self.sen_lengths = np.delete(self.sen_lengths,
+                                     np.s_[row_begin:row_end])
+        self.doc_lengths = np.delete(self.doc_lengths, doc_index)
+        self.term_matrix.delete_rows(row_begin, row_end)
+        self.sentences.delete(row_begin, row_end)
+        del self.processed_doc[doc_index]
+        self.sen_offsets = np.concatenate((
+            self.sen_offsets[:doc_index],
+            self.sen_offsets[doc_index + 1:] - (row_end - row_begin)))
+
+        # remove the words which are not in any other document
+        remained = (self.sen_freq > 0) | (sen_freq == 0)
+        if remained.all():
+            return
+        word_map = (np.cumsum(remained) - 1).astype(np.int32)
+        self.term_matrix.remap_columns(word_map, int(remained.sum()))
         for pro_doc in self.processed_doc:
-            sen_idx = 0
-            for sen in pro_doc:
-                counter_in_sen = count_word(sen)
-                for w in counter_in_sen.keys():
-                    if w in self.word_counter.cntr.keys():
-                        self.word_counter.cntr[w][doc_idx][sen_idx] += 1
-                    else:
-                        # if not add the word, init the value 2-level list with 0
-                        self.word_counter.generate_value_list(self.processed_doc, w)
-                        self.word_counter.cntr[w][doc_idx][sen_idx] += 1
-                sen_idx += 1
-            doc_idx += 1
-        self.word_list = list(self.word_counter.cntr.keys())
+            for sen_idx in range(pro_doc.__len__()):
+                sen = word_map[np.frombuffer(pro_doc[sen_idx], dtype=np.int32)]
+                pro_doc[sen_idx] = array('i', sen.tobytes())
+        self.vocabulary.compact(remained)
+        self.sen_freq = self.sen_freq[remained]
+        self.doc_freq = self.doc_freq[remained]
+        self.word_totals = self.word_totals[remained]
+
+    '''
+    count the frequencies and the lengths of the whole count matrix in
+    one pass over its entries. as every entry of a sentence is a unique
+    word, the sentence frequency of a word is the number of its entries,
+    and its doc frequency is the number of the unique (doc, word) pairs
+    of its entries.
+    '''
+
+    def _count_frequencies(self):
+        word_size = self.vocabulary.__len__()
+        rows = self.term_matrix.row_of_entries()
+        self.sen_freq = np.bincount(self.term_matrix.indices,
+                                    minlength=word_size)
+        pairs = np.unique(self.doc_of_rows(rows) * word_size
+                          + self.term_matrix.indices)
+        self.doc_freq = np.bincount(pairs % max(word_size, 1),
+                                    minlength=word_size)
+        self.word_totals = self.term_matrix.column_sums()
+        self.sen_lengths = self.term_matrix.row_sums()
+        # the number of words of every doc by the ones of its sentences
+        sums = np.zeros(self.sen_lengths.__len__() + 1, dtype=np.int64)
+        np.cumsum(self.sen_lengths, out=sums[1:])
+        self.doc_lengths = np.diff(sums[self.sen_offsets])
+        self.word_total = int(sums[-1])
+
+    # the row of the sentence in multi-doc scope
+    def sen_row(self, doc_index, sen_index):
+        return int(self.sen_offsets[doc_index]) + sen_index
+
+    # the doc every row in rows belongs to
+    def doc_of_rows(self, rows):
+        return np.searchsorted(self.sen_offsets, rows, side='right') - 1
+
+    # a list of the original sentences of every document, which is made
+    # of the sentence buffer whenever it is accessed
+    @property
+    def ori_doc(self):
+        return [self.sentences.slice(int(self.sen_offsets[d]),
+                                     int(self.sen_offsets[d + 1]))
+                for d in range(self.doc_size())]
+
+    # the list of unique words, the index of a word is its column
+    @property
+    def word_list(self):
+        return self.vocabulary.word_list
+
+    # word -> column in term_matrix, the inverse of word_list
+    @property
+    def word_index(self):
+        return self.vocabulary.word_index
 
     # count how many times the word appears in the sentence
     def count_in_sen(self, word, doc_index, sen_index):
-        if word in self.word_counter.cntr.keys():
-            return self.word_counter.cntr[word][doc_index][sen_index]
-        else:
+        word_id = self.vocabulary.get(word)
+        if word_id < 0:
             return -1
+        return self.count_in_sen_by_id(word_id, doc_index, sen_index)
+
+    def count_in_sen_by_id(self, word_id, doc_index, sen_index):
+        return self.term_matrix.count(self.sen_row(doc_index, sen_index),
+                                      word_id)
 
     # count how many times the word appears in the doc[doc_index]
     def count_in_doc(self, word, doc_index):
-        if word in self.word_counter.cntr.keys():
-            sum_count = sum(list(self.word_counter.cntr[word][doc_index]))
-            return sum_count
-        else:
+        word_id = self.vocabulary.get(word)
+        if word_id < 0:
             return -1
+        return self.count_in_doc_by_id(word_id, doc_index)
+
+    def count_in_doc_by_id(self, word_id, doc_index):
+        rows, counts = self.term_matrix.column(word_id)
+        begin, end = np.searchsorted(
+            rows, self.sen_offsets[doc_index:doc_index + 2])
+        return int(counts[begin:end].sum())
 
     # count how many times the word appears in all docs
     def count_total_in_doc(self, word):
-        if word in self.word_counter.cntr.keys():
-            s = 0
-            dual_l = self.word_counter.cntr[word]
-            for l in dual_l:
-                s += sum(l)
-            return s
-        else:
+        word_id = self.vocabulary.get(word)
+        if word_id < 0:
             return -1
+        return self.count_total_in_doc_by_id(word_id)
 
-    # count how many sentences contain the word
+    def count_total_in_doc_by_id(self, word_id):
+        return int(self.word_totals[word_id])
+
+    # count how many sentences contain the word.
+    # NOTE that the count used to be scaled by doc_size(), for the scan
+    # over the sentences was repeated once for every doc. it is the
+    # real count now, while tf_idf keeps the scale in its idf
     def count_sen_containing_word(self, word):
-        if word in self.word_counter.cntr.keys():
-            count = 0
-            for doc_idx in range(self.doc_size()):
-                # if the word was contained by the sen,
-                # the value should greater than 0
-                dual_l = self.word_counter.cntr[word]
-                for l in dual_l:
-                    for s in l:
-                        if s:
-                            count += 1
-                        else:
-                            continue
-            return count
-        else:
+        word_id = self.vocabulary.get(word)
+        if word_id < 0:
             return -1
+        return self.count_sen_containing_word_by_id(word_id)
+
+    def count_sen_containing_word_by_id(self, word_id):
+        return int(self.sen_freq[word_id])
 
     # count how many docs contain the word
     def count_doc_containing_word(self, word):
-        if word in self.word_counter.cntr.keys():
-            count = 0
-            for doc_idx in range(self.doc_size()):
-                # if the word was contained by the doc, there must be some sentence
-                # contain the word. therefore the sum should greater than 0
-                if sum(list(self.word_counter.cntr[word][doc_idx])):
-                    count += 1
-                else:
-                    continue
-            return count
-        else:
+        word_id = self.vocabulary.get(word)
+        if word_id < 0:
             return -1
+        return self.count_doc_containing_word_by_id(word_id)
+
+    def count_doc_containing_word_by_id(self, word_id):
+        return int(self.doc_freq[word_id])
 
     def doc_size(self):
         return self.processed_doc.__len__()
 
     def sen_size(self, doc_index):
-        return self.processed_doc[doc_index].__len__()
+        return int(self.sen_offsets[doc_index + 1] - self.sen_offsets[doc_index])
 
     def sen_size_total(self):
-        s = 0
-        for doc_idx in range(self.doc_size()):
-            s += self.sen_size(doc_idx)
-        return s
+        return int(self.sen_offsets[-1])
 
     # count how many word there is in the processed sen,
     # in this case, we do not care if some word repeats
     def sen_word_size(self, doc_index, sen_index):
-        s = 0
-        for word in self.word_list:
-            s += self.word_counter.cntr[word][doc_index][sen_index]
-        return s
+        return int(self.sen_lengths[self.sen_row(doc_index, sen_index)])
 
     # count how many word there is in the processed doc,
     # in this case, we do not care if some word repeats
     def doc_word_size(self, doc_index):
-        s = 0
-        for word in self.word_list:
-            l = self.word_counter.cntr[word][doc_index]
-            s += sum(list(l))
-        return s
+        return int(self.doc_lengths[doc_index])
 
     # count how many word there is in all of the processed docs
     def word_size_total(self):
-        s = 0
-        for word in self.word_list:
-            s += self.count_total_in_doc(word)
-        return s
+        return self.word_total
 
+    # the original sentence of the row, a slice of the sentence buffer
     def abstract(self, sen_rank):
-        for doc in self.ori_doc:
-            if sen_rank >= doc.__len__():
-                sen_rank -= doc.__len__()
-            else:
-                return doc[sen_rank]
+        return self.sentences[sen_rank]
+
+
+# the accessors called per word or per sentence, whose calls and time
+# are recorded when the instrumentation is enabled
+instrument.register(DocProcess, 'count_in_sen', 'count_in_sen_by_id',
+                    'count_in_doc', 'count_in_doc_by_id',
+                    'count_total_in_doc', 'count_total_in_doc_by_id',
+                    'count_sen_containing_word',
+                    'count_sen_containing_word_by_id',
+                    'count_doc_containing_word',
+                    'count_doc_containing_word_by_id',
+                    'sen_word_size', 'doc_word_size', 'abstract')
 
 
 def basic_test():
@@ -24,12 +24,17 @@ formula:
 """
 
 import math
+import instrument
 import numpy as np
-from document_process import DocProcess
-import convert_format_pyrouge as cfp
+from cluster_cache import cache_key, load_cluster, save_cluster
+from document_process import DocProcess, SentenceTermMatrix, \
+    StopWordFilter, load_stop_words, read_content
+from selection import SUMMARY_SIZE, THRESHOLD, select_sentences
+from similarity import SimilarityIndex
 
 DOC_PATH = 'doc/unprocessed_data/d30045t/'
 REFERENCE_PATH = 'doc/reference/'
+CACHE_PATH = 'doc/cache/clusters/'
 DOCUMENTS = ('NYT19981125.0417',
              'NYT19981125.0433',
              'NYT19981126.0192',
@@ -53,52 +58,78 @@ NOTE that the sentences must in one document
 
 
 '''
-the main method of the TF-IDF algorithm
+the TF-IDF values of the stored entries of a sentence-word matrix, from
+the arrays of every entry: its count, the number of words of its
+sentence, the number of sentences of its doc and the number of
+sentences containing its word. doc_size is the number of docs. both
+sparse_tf_idf and out_of_core.py compute their values by it.
+'''
+
+
+def entry_tf_idf(counts, sen_lengths, doc_sen_sizes, sen_freq, doc_size):
+    tf = counts / sen_lengths
+    # how many sentences contain the word, times the number of docs.
+    # the scale is a bug of the old count_sen_containing_word, but the
+    # summaries have been tuned with it, so it is kept here on purpose.
+    # log makes the idf value too small, so try to remove it
+    idf = np.log(doc_sen_sizes / (doc_size * sen_freq + 1))
+    return tf * idf
+
+
+# regard all sentences in docs as a long one, and compute its TF-IDF
+# value by how many times every word appears and the number of words
+def long_sentence_vector(word_totals, word_total):
+    tf = word_totals / max(word_total, 1)
+    idf = math.log(1 / (1 + 1))
+    return tf * idf
+
+
+'''
+the main method of the TF-IDF algorithm.
+the values are computed at once from the sparse count matrix of data,
+only for its stored entries: the count of every (sentence, word) entry
+is divided by the length of its sentence and multiplied by the idf of
+its word, which uses the number of sentences in the sentence's doc and
+the number of sentences containing the word. both are vectors computed
+only once. return the sentence-word TF-IDF matrix as a sparse one of
+the same entries as data.term_matrix, and the long sentence vector.
+the cost is linear in the entries, so a summary of a DocProcess can be
+refreshed at little cost after documents are added or removed.
+'''
+
+
+def sparse_tf_idf(data: DocProcess):
+    counts = data.term_matrix
+    sen_size_total, word_size = counts.shape
+    # the row (sentence index in multi-doc scope) of every non-zero count
+    rows = counts.row_of_entries()
+
+    # the number of sentences in the doc every sentence comes from
+    sen_sz_doc = np.diff(data.sen_offsets)[
+        data.doc_of_rows(np.arange(sen_size_total))]
+    # a sparse sentence-word (row as sentence) matrix, whose element is
+    # TF-IDF value
+    values = entry_tf_idf(counts.data, data.sen_lengths[rows],
+                          sen_sz_doc[rows], data.sen_freq[counts.indices],
+                          data.doc_size())
+    s_w_matrix = SentenceTermMatrix(counts.indptr, counts.indices, values,
+                                    word_size, dtype=np.float64)
+    long_sen_vector = long_sentence_vector(data.word_totals,
+                                           data.word_size_total())
+    instrument.event('tf_idf', sentences=sen_size_total, words=word_size,
+                     entries=counts.data.__len__())
+    return s_w_matrix, long_sen_vector
+
+
+'''
+the TF-IDF algorithm returning a dense sentence-word matrix, which is
+of (total sentences) x (words) and is as big as their product
 '''
 
 
 def tf_idf(data: DocProcess):
-    # a sentence-word (row as sentence) matrix, whose element is TF-IDF value
-    s_w_matrix = np.zeros((data.sen_size_total(), data.word_list.__len__()))
-
-    # transverse every sentence
-    # the sentence index in multi-doc scope
-    general_sen_idx = 0
-    for doc_idx in range(data.doc_size()):
-        # the number of all of words in a certain doc
-        for sen_idx in range(data.sen_size(doc_idx)):
-            wrd_sz_sen = data.sen_word_size(doc_idx, sen_idx)
-            for word in data.word_list:
-                # the number of how many times the word appears
-                # in a certain sentence
-                count = data.count_in_sen(word, doc_idx, sen_idx)
-                # many of 0 cases, skip for the matrix has been initialized with 0
-                if count == 0:
-                    continue
-                elif count > 0:
-                    tf = count / wrd_sz_sen
-                    # log makes the idf value too small, so try to remove it
-                    idf = math.log(data.sen_size(doc_idx) / (
-                            data.count_sen_containing_word(word) + 1))
-                    # the word index related to word list in data
-                    wrd_idx = data.word_list.index(word)
-                    s_w_matrix[general_sen_idx, wrd_idx] = tf * idf
-                elif count == -1:
-                    print('error. no such word ', word)
-                else:
-                    print('error. counter error.')
-            general_sen_idx += 1
-        print('doc ', doc_idx, ' completed.')
-    # regard all sentences in docs as a long one,
-    # and compute its TF-IDF value
-    long_sen_vector = []
-    word_size_total = data.word_size_total()
-    for word in data.word_list:
-        tf = data.count_total_in_doc(word) / word_size_total
-        idf = math.log(1 / (1 + 1))
-        long_sen_vector.append(tf * idf)
-
-    return s_w_matrix, np.array(long_sen_vector)
+    s_w_matrix, long_sen_vector = sparse_tf_idf(data)
+    return s_w_matrix.to_dense(), long_sen_vector
 
 
 '''
@@ -112,62 +143,72 @@ def cos_similarity(sentence1: np.ndarray, sentence2: np.ndarray):
     return sen1_pro_sen2 / (amp_sen1 * amp_sen2 + 1e-9)
 
 
-def write_for_test(m: np.ndarray, v: np.ndarray):
-    # create file and write arrays separated by space to the file
-    m.tofile('sentence-to-word-matrix.cache', ' ', '%.5f')
-    v.tofile('long-sentence-vector.cache', ' ', '%.5f')
-
-
-def read_for_test():
-    infile = open('sentence-to-word-matrix.cache', 'r')
-    matrix = infile.read()
-    infile.close()
-    infile = open('long-sen-vector.cache', 'r')
-    vector = infile.read()
-    infile.close()
-    return np.array(matrix), np.array(vector)
-
-
-def summarize(doc_path: str, doc_list: tuple):
-    data = DocProcess(doc_path, doc_list)
-    s_w_matrix, long_sen_vector = tf_idf(data)
-    # save the sentence to word matrix and read it for saving time
-    write_for_test(s_w_matrix, long_sen_vector)
-    # s_w_matrix, long_sen_vector = read_for_test()
-    # a list of cos similarity, whose element is a tuple of
-    # cosine value and original sentence's rank in sentence-word
-    # matrix
-    sim_lst = []
-    for r in range(s_w_matrix.shape[0]):
-        cosine = cos_similarity(s_w_matrix[r], long_sen_vector)
-        sim_lst.append((cosine, r))
-    # sort by big2small order
-    sim_lst.sort(reverse=True)
-
-    # there are some 0-based row, which are bugs
-    base_rank = 0
-    while sim_lst[base_rank][0] == 1:
-        base_rank += 1
-    current_rank = base_rank + 1
-    summary = [data.abstract(sim_lst[base_rank][1])]
-    sum_size = summary[-1].__len__()
-    while current_rank != sim_lst.__len__():
-        if sum_size >= 665:
-            break
-        else:
-            pass
-        # compare 2 sentences
-        sim = cos_similarity(s_w_matrix[sim_lst[current_rank][1]]
-                             , s_w_matrix[sim_lst[base_rank][1]])
-        # change the coefficient to change the summarization all by mind
-        if sim < 0.7:
-            summary.append(data.abstract(sim_lst[current_rank][1]))
-            base_rank = current_rank
-            current_rank = base_rank + 1
-            sum_size += summary[-1].__len__()
-        else:
-            current_rank += 1
-    return summary
+'''
+summarize the documents. if cache_path is given, the processed data of
+the documents is loaded from the cluster cache there, or saved into it
+after being processed, so that summarizing the same documents again
+skips the document process and the TF-IDF algorithm. see select_summary
+for the other arguments.
+'''
+
+
+def summarize(doc_path: str, doc_list: tuple, contents: list = None,
+              cache_path: str = None, stop_words=None,
+              summary_size: int = SUMMARY_SIZE, threshold: float = THRESHOLD,
+              mmr_lambda: float = None):
+    if not isinstance(stop_words, StopWordFilter):
+        stop_words = load_stop_words(stop_words)
+    data = None
+    if cache_path is not None:
+        if contents is None:
+            contents = [read_content(doc_path + f) for f in doc_list]
+        with instrument.stage('load_cluster'):
+            key = cache_key(contents, stop_words)
+            data = load_cluster(cache_path, key)
+        instrument.event('cache', hit=data is not None)
+    if data is not None:
+        s_w_matrix, long_sen_vector = data.s_w_matrix, data.long_sen_vector
+    else:
+        with instrument.stage('doc_process'):
+            data = DocProcess(doc_path, doc_list, stop_words=stop_words,
+                              contents=contents)
+        with instrument.stage('tf_idf'):
+            s_w_matrix, long_sen_vector = sparse_tf_idf(data)
+        if cache_path is not None:
+            with instrument.stage('save_cluster'):
+                save_cluster(cache_path, key, data, s_w_matrix,
+                             long_sen_vector)
+    return select_summary(data, s_w_matrix, long_sen_vector, summary_size,
+                          threshold, mmr_lambda)
+
+
+'''
+select the sentences of the summary by the sentence-word TF-IDF matrix
+and vector of data, which can be a DocProcess or a cached cluster. the
+matrix is a dense or a sparse one (see similarity.py). the sentences
+are ranked by their cosine similarity with the long sentence vector,
+and selected by the rules in selection.py, until the summary reaches
+summary_size. a summary of a DocProcess can be refreshed after
+documents are added to or removed from it by
+ select_summary(data, *sparse_tf_idf(data))
+which costs time linear in the stored entries, not in sentences x words
+'''
+
+
+def select_summary(data, s_w_matrix, long_sen_vector: np.ndarray,
+                   summary_size: int = SUMMARY_SIZE,
+                   threshold: float = THRESHOLD, mmr_lambda: float = None):
+    # the row norms of the matrix are computed only once
+    with instrument.stage('scores'):
+        index = SimilarityIndex(s_w_matrix)
+        scores = index.scores(long_sen_vector)
+    # change the coefficient to change the summarization all by mind
+    with instrument.stage('selection'):
+        rows = select_sentences(index, scores,
+                                lambda r: data.abstract(r).__len__(),
+                                summary_size, threshold, mmr_lambda)
+    instrument.event('summary', sentences=rows.__len__())
+    return [data.abstract(r) for r in rows]
 
 
 '''
@@ -176,10 +217,13 @@ def summarize(doc_path: str, doc_list: tuple):
 
 if __name__ == '__main__':
     summary = summarize(doc_path=DOC_PATH,
-                        doc_list=DOCUMENTS)
+                        doc_list=DOCUMENTS,
+                        cache_path=CACHE_PATH)
     print(summary)
     outfile = open('doc/systems/04systems/D30045.M.100.T.TT', 'w')
     for sentence in summary:
         outfile.write(sentence + '.\n')
     outfile.close()
+    # pyrouge is loaded only to convert the summaries
+    import convert_format_pyrouge as cfp
     cfp.convert2rouge_format()
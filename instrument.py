@@ -0,0 +1,212 @@
+"""
+        Instrument
+
+Opt-in instrumentation of the summarization, which records the wall
+time, the number of calls and the allocated bytes of
+
+ (a) the stages, such as tf_idf, which are marked by
+      with instrument.stage('tf_idf'):
+          ...
+     and the events in them, marked by instrument.event(name, ...),
+ (b) the hot paths, i.e. the methods registered by
+      instrument.register(DocProcess, 'count_in_sen', ...)
+     which are called too many times to record every call, so only
+     their totals are recorded.
+
+It is disabled by default. When it is disabled, stage() and event()
+return at once and the registered methods are the original ones, so it
+costs nothing. enable() wraps the registered methods, and disable()
+restores them.
+
+The records can be exported as JSON, or as the trace event format of
+Chrome (chrome://tracing or https://ui.perfetto.dev).
+
+usage:
+
+ instrument.enable(trace_memory=True)
+ summarize(DOC_PATH, DOCUMENTS)
+ instrument.disable()
+ instrument.save_json('instrument.json')
+ instrument.save_chrome_trace('trace.json')
+
+"""
+
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+
+_enabled = False
+_trace_memory = False
+_lock = threading.Lock()
+# the stages and events in order, as dictionaries of the trace format
+_events = []
+# name -> [calls, seconds, bytes]
+_totals = {}
+# (owner, name) of the hot paths, and the original methods of the
+# wrapped ones
+_hot_paths = []
+_originals = {}
+# the clock of the trace starts when the module is loaded
+_origin = time.perf_counter()
+
+
+class _NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_null_stage = _NullStage()
+
+
+def _memory():
+    return tracemalloc.get_traced_memory()[0] if _trace_memory else 0
+
+
+def _add_total(name, seconds, allocated):
+    with _lock:
+        total = _totals.get(name)
+        if total is None:
+            _totals[name] = [1, seconds, allocated]
+        else:
+            total[0] += 1
+            total[1] += seconds
+            total[2] += allocated
+
+
+class _Stage:
+    def __init__(self, name: str, args: dict):
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.memory = _memory()
+        self.begin = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter()
+        allocated = _memory() - self.memory
+        _add_total(self.name, end - self.begin, allocated)
+        args = dict(self.args)
+        args['bytes'] = allocated
+        with _lock:
+            _events.append({'name': self.name, 'cat': 'stage', 'ph': 'X',
+                            'ts': (self.begin - _origin) * 1e6,
+                            'dur': (end - self.begin) * 1e6,
+                            'pid': os.getpid(),
+                            'tid': threading.get_ident(),
+                            'args': args})
+        return False
+
+
+# a context manager recording the stage
+def stage(name: str, **args):
+    if not _enabled:
+        return _null_stage
+    return _Stage(name, args)
+
+
+# record an event at this moment, with the arguments as its data
+def event(name: str, **args):
+    if not _enabled:
+        return
+    with _lock:
+        _events.append({'name': name, 'cat': 'event', 'ph': 'i', 's': 't',
+                        'ts': (time.perf_counter() - _origin) * 1e6,
+                        'pid': os.getpid(), 'tid': threading.get_ident(),
+                        'args': args})
+
+
+def _wrap(name: str, method):
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        memory = _memory()
+        begin = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            _add_total(name, time.perf_counter() - begin, _memory() - memory)
+    return wrapper
+
+
+# register the methods of the owner (a class or a module) as hot paths
+def register(owner, *names):
+    for name in names:
+        _hot_paths.append((owner, name))
+        if _enabled:
+            _patch(owner, name)
+
+
+def _patch(owner, name):
+    if (owner, name) in _originals:
+        return
+    method = owner.__dict__[name]
+    _originals[(owner, name)] = method
+    setattr(owner, name, _wrap(owner.__name__ + '.' + name, method))
+
+
+def enable(trace_memory: bool = False):
+    global _enabled, _trace_memory
+    _trace_memory = trace_memory
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    for owner, name in _hot_paths:
+        _patch(owner, name)
+    _enabled = True
+
+
+def disable():
+    global _enabled, _trace_memory
+    _enabled = False
+    for (owner, name), method in _originals.items():
+        setattr(owner, name, method)
+    _originals.clear()
+    if _trace_memory and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    _trace_memory = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def reset():
+    with _lock:
+        del _events[:]
+        _totals.clear()
+
+
+# name -> {'calls', 'seconds', 'bytes'} of the stages and the hot paths
+def totals():
+    with _lock:
+        return {name: {'calls': t[0], 'seconds': t[1], 'bytes': t[2]}
+                for name, t in _totals.items()}
+
+
+def save_json(path: str):
+    with _lock:
+        events = list(_events)
+    outfile = open(path, 'w')
+    json.dump({'totals': totals(), 'events': events}, outfile, indent=1)
+    outfile.close()
+
+
+'''
+save the records in the trace event format of Chrome. the hot paths are
+not traced call by call, their totals are in the metadata.
+'''
+
+
+def save_chrome_trace(path: str):
+    with _lock:
+        events = list(_events)
+    outfile = open(path, 'w')
+    json.dump({'traceEvents': events, 'displayTimeUnit': 'ms',
+               'otherData': {'totals': totals()}}, outfile)
+    outfile.close()
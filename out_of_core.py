@@ -0,0 +1,380 @@
+"""
+        Out-of-core Summarization
+
+Summarize a cluster too large for the memory, i.e. one whose dense
+sentence-word TF-IDF matrix (or even whose DocProcess) does not fit.
+
+ pass 1  the documents are streamed sentence by sentence, and every
+         sentence is tokenized and appended to files in work_path:
+          indptr.bin        int64, the CSR row pointers
+          indices.bin       int32, the word index of every entry
+          sentences.txt     the original sentences in utf-8
+          text_offsets.bin  int64, the byte offset of every sentence
+         only the vocabulary and the number of sentences of every doc
+         are kept in the memory.
+ pass 2  the files are memory-mapped, and the sentence frequencies,
+         then the TF-IDF value of every entry, are computed chunk by
+         chunk of rows and written into
+          values.bin        float64, the TF-IDF value of every entry
+ scores  the cosine similarity of every sentence with the long sentence
+         vector is computed chunk by chunk as well.
+ select  only the top ranked rows, the candidates, are read into the
+         memory as a small sparse matrix, and the sentences are selected
+         among them by selection.py. if the candidates run out before
+         the summary is full, twice as many are read, as many as the
+         memory limit allows. if the limit stops them first, the summary
+         is short of summary_size, and a RuntimeWarning is issued.
+
+The size of a chunk and the number of candidates are bounded by the
+memory limit. Apart from them, the memory grows only with the number of
+words (the vocabulary and its frequencies) and with the number of
+sentences (8 bytes of score per sentence).
+
+The TF-IDF values are computed by entry_tf_idf of
+document_summarization.py as the ones of tf_idf are, so they are
+exactly the same, and so is the summary by the threshold rule. The
+summary by MMR is selected among the candidates only.
+
+usage:
+
+ $ python3 out_of_core.py doc/unprocessed_data/d30045t -m 256
+
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import warnings
+from array import array
+
+import numpy as np
+from document_process import SentenceStore, SentenceTermMatrix, Tokenizer, \
+    Vocabulary, get_stemmer, iter_sentences, load_stop_words
+from document_summarization import entry_tf_idf, long_sentence_vector
+from selection import SUMMARY_SIZE, THRESHOLD, ranked_chunks, \
+    select_sentences
+from similarity import EPSILON, SimilarityIndex
+
+MEMORY_LIMIT = 256 * 2 ** 20
+# the bytes of the temporary arrays per entry in a chunk
+ENTRY_BYTES = 64
+# the number of candidates read at first
+CANDIDATES = 256
+
+'''
+an array file written by appending, whose items are buffered in the
+memory and written when the buffer is full
+'''
+
+
+class _ArrayWriter:
+    def __init__(self, path: str, typecode: str, buffer_size: int):
+        self.path = path
+        self.file = open(path, 'wb')
+        self.typecode = typecode
+        self.buffer = array(typecode)
+        self.buffer_size = max(buffer_size, 1)
+        self.size = 0
+
+    def append(self, value):
+        self.buffer.append(value)
+        if self.buffer.__len__() >= self.buffer_size:
+            self.flush()
+
+    def extend(self, values):
+        self.buffer.extend(values)
+        if self.buffer.__len__() >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        self.buffer.tofile(self.file)
+        self.size += self.buffer.__len__()
+        self.buffer = array(self.typecode)
+
+    def close(self):
+        self.flush()
+        self.file.close()
+        return self.size
+
+
+# memory-map an array file, an empty file can not be memory-mapped
+def _map(path: str, dtype):
+    if not os.path.getsize(path):
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r')
+
+
+'''
+a cluster processed out of core into the files in work_path, which is
+a temporary directory removed by close() if it is not given
+'''
+
+
+class OutOfCoreCluster:
+    def __init__(self, doc_path: str, doc_list: tuple, work_path: str = None,
+                 stop_words=None, stemmer=None,
+                 memory_limit: int = MEMORY_LIMIT, contents: list = None):
+        self.temporary = work_path is None
+        self.work_path = tempfile.mkdtemp(prefix='out-of-core-') \
+            if work_path is None else work_path
+        os.makedirs(self.work_path, exist_ok=True)
+        self.memory_limit = memory_limit
+        # the entries of a chunk of rows
+        self.chunk_entries = max(memory_limit // ENTRY_BYTES, 1)
+        if stop_words is None or isinstance(stop_words, str):
+            stop_words = load_stop_words(stop_words)
+        if stemmer is None:
+            stemmer = get_stemmer()
+        self.vocabulary = Vocabulary()
+        self._tokenize(doc_path, doc_list, stop_words, stemmer, contents)
+        self._tf_idf()
+
+    def _file(self, name: str):
+        return os.path.join(self.work_path, name)
+
+    # pass 1, stream the documents into the files
+    def _tokenize(self, doc_path, doc_list, stop_words, stemmer, contents):
+        tokenizer = Tokenizer(stop_words, stemmer, self.vocabulary)
+        buffer_size = self.chunk_entries
+        indptr = _ArrayWriter(self._file('indptr.bin'), 'q', buffer_size)
+        indices = _ArrayWriter(self._file('indices.bin'), 'i', buffer_size)
+        offsets = _ArrayWriter(self._file('text_offsets.bin'), 'q',
+                               buffer_size)
+        text = open(self._file('sentences.txt'), 'wb')
+        doc_sizes = [0] * doc_list.__len__()
+        entry_size = 0
+        text_size = 0
+        indptr.append(0)
+        offsets.append(0)
+        for doc_idx, sen_idx, s in iter_sentences(doc_path, doc_list,
+                                                  contents):
+            sen = sorted(set(tokenizer.tokenize(s)))
+            indices.extend(sen)
+            entry_size += sen.__len__()
+            indptr.append(entry_size)
+            b = s.encode('utf-8')
+            text.write(b)
+            text_size += b.__len__()
+            offsets.append(text_size)
+            doc_sizes[doc_idx] += 1
+        indptr.close()
+        indices.close()
+        offsets.close()
+        text.close()
+
+        self.sen_offsets = np.zeros(doc_sizes.__len__() + 1, dtype=np.int64)
+        np.cumsum(doc_sizes, out=self.sen_offsets[1:])
+        self.indptr = _map(self._file('indptr.bin'), np.int64)
+        self.indices = _map(self._file('indices.bin'), np.int32)
+        self.sentences = SentenceStore(
+            _map(self._file('sentences.txt'), np.uint8),
+            _map(self._file('text_offsets.bin'), np.int64))
+
+    # the (row_begin, row_end) of the chunks of rows
+    def chunks(self):
+        row_size = self.sen_size_total()
+        begin = 0
+        while begin < row_size:
+            end = int(np.searchsorted(
+                self.indptr, self.indptr[begin] + self.chunk_entries,
+                side='right')) - 1
+            end = min(max(end, begin + 1), row_size)
+            yield begin, end
+            begin = end
+
+    # the entries of the rows, and the local row of every entry
+    def _entries(self, row_begin, row_end):
+        ptr = np.asarray(self.indptr[row_begin:row_end + 1])
+        lengths = np.diff(ptr)
+        local_rows = np.repeat(np.arange(row_end - row_begin), lengths)
+        return slice(int(ptr[0]), int(ptr[-1])), lengths, local_rows
+
+    '''
+    pass 2, compute the TF-IDF values of the entries chunk by chunk by
+    entry_tf_idf, as tf_idf does. every word of a sentence is counted
+    once, so the count of every entry is 1, the length of a sentence is
+    its number of entries, and how many times a word appears is its
+    sentence frequency.
+    '''
+
+    def _tf_idf(self):
+        word_size = self.vocabulary.__len__()
+        self.sen_freq = np.zeros(word_size, dtype=np.int64)
+        for row_begin, row_end in self.chunks():
+            entries = self._entries(row_begin, row_end)[0]
+            self.sen_freq += np.bincount(self.indices[entries],
+                                         minlength=word_size)
+        self.word_total = self.indices.__len__()
+
+        doc_sen_sizes = np.diff(self.sen_offsets)
+        outfile = open(self._file('values.bin'), 'wb')
+        for row_begin, row_end in self.chunks():
+            entries, lengths, local_rows = self._entries(row_begin, row_end)
+            indices = self.indices[entries]
+            docs = np.searchsorted(self.sen_offsets,
+                                   np.arange(row_begin, row_end),
+                                   side='right') - 1
+            entry_tf_idf(1, lengths[local_rows],
+                         doc_sen_sizes[docs][local_rows],
+                         self.sen_freq[indices],
+                         self.doc_size()).tofile(outfile)
+        outfile.close()
+        self.values = _map(self._file('values.bin'), np.float64)
+        self.long_sen_vector = long_sentence_vector(self.sen_freq,
+                                                    self.word_total)
+
+    def doc_size(self):
+        return self.sen_offsets.__len__() - 1
+
+    def sen_size_total(self):
+        return int(self.sen_offsets[-1])
+
+    def abstract(self, sen_rank):
+        return self.sentences[sen_rank]
+
+    # the cosine similarity of every sentence with the vector, chunk by
+    # chunk of rows
+    def scores(self, vector: np.ndarray):
+        amp = np.linalg.norm(vector)
+        scores = np.empty(self.sen_size_total())
+        for row_begin, row_end in self.chunks():
+            entries, lengths, local_rows = self._entries(row_begin, row_end)
+            values = np.asarray(self.values[entries])
+            products = np.bincount(
+                local_rows, weights=values * vector[self.indices[entries]],
+                minlength=row_end - row_begin)
+            norms = np.sqrt(np.bincount(local_rows, weights=np.square(values),
+                                        minlength=row_end - row_begin))
+            scores[row_begin:row_end] = products / (norms * amp + EPSILON)
+        return scores
+
+    # read the rows into the memory as a sparse matrix
+    def rows(self, rows: np.ndarray):
+        indptr = np.zeros(rows.__len__() + 1, dtype=np.int64)
+        np.cumsum(self.indptr[rows + 1] - self.indptr[rows],
+                  out=indptr[1:])
+        indices = np.empty(indptr[-1], dtype=np.int32)
+        data = np.empty(indptr[-1])
+        for i, r in enumerate(rows.tolist()):
+            begin, end = int(self.indptr[r]), int(self.indptr[r + 1])
+            indices[indptr[i]:indptr[i + 1]] = self.indices[begin:end]
+            data[indptr[i]:indptr[i + 1]] = self.values[begin:end]
+        return SentenceTermMatrix(indptr, indices, data,
+                                  self.vocabulary.__len__(), dtype=np.float64)
+
+    '''
+    select the sentences of the summary among the top ranked candidates.
+    the candidates are sorted by row, so that the ties of scores are
+    ranked among them as among all rows. if the summary is not full
+    when the candidates run out, twice as many candidates are read, but
+    no more than the memory limit allows. a RuntimeWarning is issued if
+    the summary is short for the limit.
+    '''
+
+    def summarize(self, summary_size: int = SUMMARY_SIZE,
+                  threshold: float = THRESHOLD, mmr_lambda: float = None):
+        scores = self.scores(self.long_sen_vector)
+        row_size = scores.__len__()
+        # the bytes of a candidate row, and the most candidates within
+        # the memory limit
+        row_bytes = 12 * max(self.indices.__len__() // max(row_size, 1), 1)
+        max_count = min(max(self.memory_limit // row_bytes, 1), row_size)
+        count = min(CANDIDATES, max_count, row_size)
+        ranked = ranked_chunks(scores)
+        top = np.zeros(0, dtype=np.int64)
+        while True:
+            while top.__len__() < count:
+                top = np.concatenate((top, next(ranked)))
+            # the ranked chunks may overshoot the count
+            candidates = np.sort(top[:count])
+            index = SimilarityIndex(self.rows(candidates), self.memory_limit)
+            sizes = {}
+
+            def size_of(r):
+                if r not in sizes:
+                    sizes[r] = self.abstract(int(candidates[r])).__len__()
+                return sizes[r]
+
+            selected = select_sentences(index, scores[candidates], size_of,
+                                        summary_size, threshold, mmr_lambda)
+            size = sum(size_of(r) for r in selected)
+            if size >= summary_size or candidates.__len__() == row_size:
+                break
+            if count >= max_count:
+                warnings.warn(
+                    'the summary is of %d bytes, short of %d, for only %d '
+                    'of %d sentences can be read as the candidates under '
+                    'the memory limit of %d bytes'
+                    % (size, summary_size, candidates.__len__(), row_size,
+                       self.memory_limit), RuntimeWarning)
+                break
+            count = min(2 * count, max_count)
+        return [self.abstract(int(candidates[r])) for r in selected]
+
+    def close(self):
+        self.indptr = self.indices = self.values = self.sentences = None
+        if self.temporary:
+            shutil.rmtree(self.work_path, ignore_errors=True)
+
+
+'''
+summarize the documents out of core, in work_path or in a temporary
+directory, under the memory limit in bytes
+'''
+
+
+def summarize_out_of_core(doc_path: str, doc_list: tuple,
+                          work_path: str = None,
+                          memory_limit: int = MEMORY_LIMIT,
+                          stop_words=None, summary_size: int = SUMMARY_SIZE,
+                          threshold: float = THRESHOLD,
+                          mmr_lambda: float = None):
+    cluster = OutOfCoreCluster(doc_path, doc_list, work_path, stop_words,
+                               memory_limit=memory_limit)
+    try:
+        return cluster.summarize(summary_size, threshold, mmr_lambda)
+    finally:
+        cluster.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='summarize a cluster larger than the memory')
+    parser.add_argument('doc_path', help='directory of the documents')
+    parser.add_argument('-m', '--memory', type=int,
+                        default=MEMORY_LIMIT // 2 ** 20,
+                        help='memory limit of the chunks in MiB')
+    parser.add_argument('-w', '--work-path',
+                        help='directory of the files, a temporary one '
+                             'if it is not given')
+    parser.add_argument('-o', '--output', help='summary file')
+    parser.add_argument('-s', '--stop-words', help='stop word list file')
+    parser.add_argument('-b', '--summary-size', type=int,
+                        default=SUMMARY_SIZE)
+    parser.add_argument('-t', '--threshold', type=float, default=THRESHOLD)
+    args = parser.parse_args()
+
+    doc_path = os.path.join(args.doc_path, '')
+    doc_list = tuple(f for f in sorted(os.listdir(doc_path))
+                     if not f.startswith('.')
+                     and os.path.isfile(doc_path + f))
+    summary = summarize_out_of_core(doc_path, doc_list, args.work_path,
+                                    args.memory * 2 ** 20, args.stop_words,
+                                    args.summary_size, args.threshold)
+    if args.output:
+        outfile = open(args.output, 'w')
+        for sentence in summary:
+            outfile.write(sentence + '.\n')
+        outfile.close()
+    else:
+        for sentence in summary:
+            print(sentence + '.')
+
+
+'''
+//  main  //
+'''
+
+if __name__ == '__main__':
+    main()
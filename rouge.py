@@ -0,0 +1,335 @@
+"""
+        ROUGE
+
+Score summaries by ROUGE-N and ROUGE-L in the process, in place of
+converting them by convert_format_pyrouge.py and running ROUGE-1.5.5.pl
+on rouge_test.xml, so that many summaries can be scored at once in the
+memory. The scores follow the options of USE-ROUGE.md:
+
+ -b 665   only the first 665 bytes of every summary are scored
+ -m       the words are stemmed by the Porter stemmer
+ -f A     the counts of all of the model summaries are added up
+          (-f B, the best model summary, is supported as well)
+ -p 0.5   F = 1 / (alpha / P + (1 - alpha) / R), alpha = 0.5
+
+and the scores are jackknifed over the model summaries, i.e. averaged
+over the subsets leaving one model summary out, if there are more than
+one model summaries. Stop words are removed (as -s does) only if a
+StopWordFilter is given.
+
+A summary is a list of sentences. The words of all of the summaries
+are mapped to integers by one vocabulary, and the n-grams of a peer
+summary and its model summaries are counted in one pass of numpy.
+
+usage:
+
+ $ python3 rouge.py doc/systems/04systems doc/model/04model
+
+where the model summaries of a peer one D30045.M.100.T.TT are the
+files D30045.M.100.T.[A-Z] of the model directory.
+
+"""
+
+import argparse
+import os
+import re
+
+import numpy as np
+from document_process import StopWordFilter, Vocabulary, get_stemmer, \
+    load_stop_words
+
+BYTE_LIMIT = 665
+ALPHA = 0.5
+MAX_N = 2
+
+'''
+the sentences of the summary within the first `limit` bytes, where the
+sentences are separated by a space as the lines of a summary file are
+by ROUGE. the last sentence may be cut.
+'''
+
+
+def truncate(sentences: list, limit: int = BYTE_LIMIT):
+    if not limit:
+        return list(sentences)
+    result = []
+    size = 0
+    for sentence in sentences:
+        b = sentence.encode('utf-8')
+        if size + b.__len__() >= limit:
+            result.append(b[:limit - size].decode('utf-8', errors='ignore'))
+            break
+        result.append(sentence)
+        size += b.__len__() + 1
+    return result
+
+
+# recall, precision and F from the hits and the counts
+def _rpf(hit, model_count, peer_count, alpha):
+    recall = hit / model_count if model_count else 0.0
+    precision = hit / peer_count if peer_count else 0.0
+    if recall and precision:
+        f = 1 / (alpha / precision + (1 - alpha) / recall)
+    else:
+        f = 0.0
+    return np.array([recall, precision, f])
+
+
+'''
+the length of the longest common subsequence of a and b, as the table
+of the dynamic programming. a row of the table is computed at once: as
+the LCS of a[:i+1] and b[:j+1] is the max of the ones of a[:i+1] and
+b[:j], it is the running max of the row made of the last one.
+'''
+
+
+def lcs_table(a: np.ndarray, b: np.ndarray):
+    table = np.zeros((a.__len__() + 1, b.__len__() + 1), dtype=np.int32)
+    for i in range(a.__len__()):
+        row = table[i, :-1] + (b == a[i])
+        np.maximum(row, table[i, 1:], out=row)
+        np.maximum.accumulate(row, out=table[i + 1, 1:])
+    return table
+
+
+# the positions in a of one longest common subsequence of a and b
+def lcs_positions(a: np.ndarray, b: np.ndarray):
+    table = lcs_table(a, b)
+    positions = []
+    i, j = a.__len__(), b.__len__()
+    while i and j:
+        if a[i - 1] == b[j - 1]:
+            positions.append(i - 1)
+            i -= 1
+            j -= 1
+        elif table[i - 1, j] >= table[i, j - 1]:
+            i -= 1
+        else:
+            j -= 1
+    return positions
+
+
+'''
+a scorer of summaries, which keeps the stemmer, the stop words and the
+vocabulary of the words of all of the summaries it has scored
+'''
+
+
+class RougeScorer:
+    def __init__(self, n: int = MAX_N, byte_limit: int = BYTE_LIMIT,
+                 stem: bool = True, stop_words: StopWordFilter = None,
+                 alpha: float = ALPHA, mode: str = 'A', stemmer=None):
+        if mode not in ('A', 'B'):
+            raise ValueError('mode must be A or B, not ' + repr(mode))
+        self.n = n
+        self.byte_limit = byte_limit
+        self.stop_words = stop_words
+        self.alpha = alpha
+        self.mode = mode
+        self.stemmer = None
+        if stem:
+            self.stemmer = stemmer if stemmer is not None else get_stemmer()
+        self.vocabulary = Vocabulary()
+
+    # the words of a sentence in lower case, with the characters other
+    # than letters and digits as separators. the words longer than 3
+    # letters are stemmed as ROUGE does
+    def words(self, sentence: str):
+        words = re.split('[^a-z0-9]+', sentence.lower())
+        if self.stop_words is not None:
+            words = [w for w in words if w not in self.stop_words]
+        if self.stemmer is not None:
+            words = [self.stemmer.stem(w) if w.__len__() > 3 else w
+                     for w in words]
+        return [w for w in words if w]
+
+    # the summary within the byte limit as a list of the word id arrays
+    # of its sentences
+    def tokenize(self, sentences: list):
+        return [np.array([self.vocabulary.add(w) for w in self.words(s)],
+                         dtype=np.int64)
+                for s in truncate(sentences, self.byte_limit)]
+
+    '''
+    the hits of ROUGE-n of the peer with every model, and the counts
+    of the n-grams of the peer and every model. all n-grams are given
+    ids at once by np.unique, and counted by one bincount.
+    '''
+
+    def _ngram_hits(self, peer: list, models: list, n: int):
+        summaries = [np.concatenate(s) if s else np.zeros(0, np.int64)
+                     for s in [peer] + models]
+        grams = []
+        owners = []
+        for idx, tokens in enumerate(summaries):
+            size = max(tokens.__len__() - n + 1, 0)
+            grams.append(np.stack([tokens[k:k + size] for k in range(n)],
+                                  axis=1) if size else
+                         np.zeros((0, n), np.int64))
+            owners.append(np.full(size, idx, dtype=np.int64))
+        grams = np.concatenate(grams)
+        owners = np.concatenate(owners)
+        counts = np.bincount(owners, minlength=summaries.__len__())
+        if not grams.__len__():
+            return np.zeros(models.__len__()), counts[0], counts[1:]
+        ids = np.unique(grams, axis=0, return_inverse=True)[1].reshape(-1)
+        gram_size = int(ids.max()) + 1
+        table = np.bincount(owners * gram_size + ids,
+                            minlength=summaries.__len__() * gram_size)
+        table = table.reshape(summaries.__len__(), gram_size)
+        hits = np.minimum(table[0], table[1:]).sum(axis=1)
+        return hits, counts[0], counts[1:]
+
+    '''
+    the hits of ROUGE-L of the peer with a model, i.e. the sum of the
+    union LCS of every model sentence with all of the peer sentences.
+    a word is hit no more times than it appears in the peer or in the
+    model.
+    '''
+
+    def _lcs_hits(self, peer: list, model: list):
+        peer_left = {}
+        model_left = {}
+        for s in peer:
+            for w in s.tolist():
+                peer_left[w] = peer_left.get(w, 0) + 1
+        for s in model:
+            for w in s.tolist():
+                model_left[w] = model_left.get(w, 0) + 1
+        hits = 0
+        for m in model:
+            union = set()
+            for p in peer:
+                union.update(lcs_positions(m, p))
+            for pos in sorted(union):
+                w = int(m[pos])
+                if peer_left.get(w, 0) > 0 and model_left.get(w, 0) > 0:
+                    peer_left[w] -= 1
+                    model_left[w] -= 1
+                    hits += 1
+        return hits
+
+    # (recall, precision, F) of the peer against a subset of the models
+    def _subset_score(self, hits, peer_count, model_counts, subset):
+        if self.mode == 'A':
+            return _rpf(hits[subset].sum(), model_counts[subset].sum(),
+                        peer_count * subset.__len__(), self.alpha)
+        scores = [_rpf(hits[m], model_counts[m], peer_count, self.alpha)
+                  for m in subset]
+        return max(scores, key=lambda s: s[2])
+
+    # jackknife the scores over the models if there are more than one
+    def _jackknife(self, hits, peer_count, model_counts):
+        size = model_counts.__len__()
+        if size < 2:
+            return self._subset_score(hits, peer_count, model_counts,
+                                      np.arange(size))
+        scores = [self._subset_score(hits, peer_count, model_counts,
+                                     np.delete(np.arange(size), m))
+                  for m in range(size)]
+        return np.mean(scores, axis=0)
+
+    '''
+    score the peer summary against the model summaries, which are
+    lists of sentences. return a dictionary of 'rouge-1' ... 'rouge-n'
+    and 'rouge-l' to (recall, precision, F).
+    '''
+
+    def score(self, peer: list, models: list):
+        peer = self.tokenize(peer)
+        models = [self.tokenize(m) for m in models]
+        result = {}
+        for n in range(1, self.n + 1):
+            hits, peer_count, model_counts = self._ngram_hits(peer, models, n)
+            result['rouge-' + str(n)] = tuple(
+                self._jackknife(hits, peer_count, model_counts).tolist())
+        hits = np.array([self._lcs_hits(peer, m) for m in models])
+        model_counts = np.array([sum(s.__len__() for s in m)
+                                 for m in models])
+        peer_count = sum(s.__len__() for s in peer)
+        result['rouge-l'] = tuple(
+            self._jackknife(hits, peer_count, model_counts).tolist())
+        return result
+
+    # score every (peer, models) pair, and average the scores
+    def score_many(self, pairs):
+        scores = [self.score(peer, models) for peer, models in pairs]
+        if not scores:
+            return [], {}
+        average = {k: tuple(np.mean([s[k] for s in scores], axis=0).tolist())
+                   for k in scores[0]}
+        return scores, average
+
+
+# the sentences of a summary file, one per line
+def read_summary(path: str):
+    infile = open(path, 'r')
+    lines = [l.strip() for l in infile.read().split('\n')]
+    infile.close()
+    return [l for l in lines if l]
+
+
+'''
+return a list of (peer file, model files) of the peer summaries in
+system_path, whose model summaries in model_path are named after them
+as D30045.M.100.T.B is after D30045.M.100.T.TT
+'''
+
+
+def find_summaries(system_path: str, model_path: str):
+    models = sorted(os.listdir(model_path))
+    pairs = []
+    for peer in sorted(os.listdir(system_path)):
+        prefix = peer.rsplit('.', 1)[0] + '.'
+        matched = [os.path.join(model_path, m) for m in models
+                   if m.startswith(prefix)
+                   and re.fullmatch('[A-Z]', m[prefix.__len__():])]
+        if matched:
+            pairs.append((os.path.join(system_path, peer), matched))
+    return pairs
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='score the summaries by ROUGE-N and ROUGE-L')
+    parser.add_argument('system_path', help='directory of the summaries')
+    parser.add_argument('model_path',
+                        help='directory of the model summaries')
+    parser.add_argument('-n', type=int, default=MAX_N,
+                        help='max n of ROUGE-N')
+    parser.add_argument('-b', type=int, default=BYTE_LIMIT,
+                        help='bytes of a summary to score, 0 for all')
+    parser.add_argument('-p', type=float, default=ALPHA,
+                        help='weight of the precision in F')
+    parser.add_argument('-f', choices=('A', 'B'), default='A',
+                        help='A to add up the models, B for the best one')
+    parser.add_argument('--no-stem', action='store_true',
+                        help='do not stem the words')
+    parser.add_argument('-s', metavar='STOP_WORD_LIST',
+                        help='remove the stop words in the list file')
+    args = parser.parse_args()
+
+    stop_words = None
+    if args.s:
+        stop_words = load_stop_words(args.s)
+    scorer = RougeScorer(args.n, args.b, not args.no_stem, stop_words,
+                         args.p, args.f)
+    pairs = find_summaries(args.system_path, args.model_path)
+    scores, average = scorer.score_many(
+        (read_summary(peer), [read_summary(m) for m in models])
+        for peer, models in pairs)
+    for (peer, models), score in zip(pairs, scores):
+        for name in sorted(score):
+            print('%s %s R: %.5f P: %.5f F: %.5f'
+                  % (os.path.basename(peer), name.upper(), *score[name]))
+    for name in sorted(average):
+        print('Average %s R: %.5f P: %.5f F: %.5f'
+              % (name.upper(), *average[name]))
+
+
+'''
+//  main  //
+'''
+
+if __name__ == '__main__':
+    main()
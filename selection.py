@@ -0,0 +1,152 @@
+"""
+        Selection
+
+Select the sentences of a summary by their cosine similarity with the
+long sentence vector (the scores), avoiding redundant sentences, until
+the summary reaches the size limit.
+
+A running vector of the max similarity of every sentence with all of
+the selected sentences is kept, which is updated by one vectorized step
+for every selected sentence, so the selection costs O(k * n) array
+operations for k selected sentences out of n. The sentences are ranked
+lazily, only as far as the selection goes.
+
+Two rules of redundancy are supported:
+
+ threshold - the sentences are taken in the order of their scores, and
+             a sentence is selected only if its similarity with every
+             selected sentence is less than the threshold.
+ MMR       - the maximal marginal relevance, i.e. the sentence with the
+             max value of
+              lambda * score - (1 - lambda) * max similarity
+             is selected one by one.
+
+"""
+
+import numpy as np
+
+# the size limit of a summary, as -b 665 in ROUGE
+SUMMARY_SIZE = 665
+# the similarity threshold of redundant sentences
+THRESHOLD = 0.7
+# the number of top rows ranked at first
+RANK_WINDOW = 64
+
+'''
+the rows in the order of their scores, big to small. the rows of equal
+scores are ordered big to small as well.
+'''
+
+
+def rank(scores: np.ndarray):
+    return np.lexsort((-np.arange(scores.__len__()), -scores))
+
+
+'''
+a generator of the rows in the order of their scores, as rank(scores)
+is, but chunk by chunk. a chunk is the top `window` rows of the rest,
+found by partial selection (argpartition) and then sorted, and the
+window is doubled after every chunk. so only a few more rows than the
+selected ones are sorted, unless the redundancy rule rejects many of
+them.
+'''
+
+
+def ranked_chunks(scores: np.ndarray, window: int = RANK_WINDOW):
+    rest = np.arange(scores.__len__())
+    while rest.__len__():
+        if window >= rest.__len__():
+            yield rest[rank(scores[rest])]
+            return
+        rest_scores = scores[rest]
+        top = np.argpartition(-rest_scores, window - 1)[:window]
+        boundary = rest_scores[top].min()
+        # the rows of the boundary score may be outside the window,
+        # they are ranked in the next chunk unless all rows in the
+        # window are of the boundary score
+        in_chunk = rest_scores > boundary
+        if not in_chunk.any():
+            in_chunk = rest_scores == boundary
+        chunk = rest[in_chunk]
+        yield chunk[rank(scores[chunk])]
+        rest = rest[~in_chunk]
+        window *= 2
+
+
+'''
+select sentences by the threshold rule. index is a SimilarityIndex of
+the sentences, size_of(row) is the size of a sentence. return the
+selected rows in order.
+'''
+
+
+def select_by_threshold(index, scores: np.ndarray, size_of,
+                        summary_size: int = SUMMARY_SIZE,
+                        threshold: float = THRESHOLD):
+    selected = []
+    sum_size = 0
+    # the max similarity of every sentence with the selected ones,
+    # so that the first sentence is always selected
+    max_sim = np.full(scores.__len__(), -np.inf)
+    leading = True
+    for chunk in ranked_chunks(scores):
+        if leading:
+            # there are some 0-based row, which are bugs
+            pos = np.flatnonzero(scores[chunk] != 1)
+            if not pos.__len__():
+                continue
+            chunk = chunk[pos[0]:]
+            leading = False
+        while chunk.__len__() and sum_size < summary_size:
+            # the next sentence which is not similar to any selected one
+            later = np.flatnonzero(max_sim[chunk] < threshold)
+            if not later.__len__():
+                break
+            row = int(chunk[later[0]])
+            selected.append(row)
+            sum_size += size_of(row)
+            np.maximum(max_sim, index.similarity_to(row), out=max_sim)
+            chunk = chunk[later[0] + 1:]
+        if sum_size >= summary_size:
+            break
+    return selected
+
+
+'''
+select sentences by maximal marginal relevance, where mmr_lambda is
+the weight of the scores against the redundancy. return the selected
+rows in order.
+'''
+
+
+def select_by_mmr(index, scores: np.ndarray, size_of,
+                  summary_size: int = SUMMARY_SIZE, mmr_lambda: float = 0.7):
+    # there are some 0-based row, which are bugs
+    candidate = scores != 1
+    selected = []
+    sum_size = 0
+    max_sim = np.zeros(scores.__len__())
+    while candidate.any() and sum_size < summary_size:
+        mmr = mmr_lambda * scores - (1 - mmr_lambda) * max_sim
+        mmr[~candidate] = -np.inf
+        row = int(np.argmax(mmr))
+        selected.append(row)
+        candidate[row] = False
+        sum_size += size_of(row)
+        np.maximum(max_sim, index.similarity_to(row), out=max_sim)
+    return selected
+
+
+'''
+select sentences by MMR if mmr_lambda is given, otherwise by the
+threshold rule
+'''
+
+
+def select_sentences(index, scores: np.ndarray, size_of,
+                     summary_size: int = SUMMARY_SIZE,
+                     threshold: float = THRESHOLD, mmr_lambda: float = None):
+    if mmr_lambda is not None:
+        return select_by_mmr(index, scores, size_of, summary_size, mmr_lambda)
+    return select_by_threshold(index, scores, size_of, summary_size,
+                               threshold)
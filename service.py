@@ -0,0 +1,428 @@
+"""
+        Summarization Service
+
+A long-running HTTP service of the summarization, made of asyncio and
+the standard library only. The stop words, the stemmer (with its stem
+cache) and numpy are loaded once in every worker process and kept warm
+across the requests. The stems learned by the workers are merged into
+one stem cache table, which is saved on shutdown if --stem-table is
+given, and loaded by the workers at the next start.
+
+ POST /summarize   summarize the documents in the JSON body
+                    {"documents": ["<DOC>...", ...],
+                     "summary_size": 665, "threshold": 0.7,
+                     "mmr_lambda": null}
+                   a document is the content of a document file, or
+                   plain text, which is regarded as the text of one.
+                   the response is {"summary": ["sentence", ...]}
+ GET /health       the numbers of the pending and the served requests,
+                   and the hits and misses of the stem caches
+
+The CPU-bound work runs on a bounded pool of worker processes, which
+are started by forkserver (or spawn), so that they never inherit the
+sockets of the service. The requests arriving within a short window
+are batched, and a batch is split into one task per worker. In a task,
+every request is processed with its own vocabulary, and the TF-IDF
+matrices of the requests are stacked block-diagonally, so that all of
+the sentences are scored against their own centroids in one pass,
+while the sentences are selected request by request. A request failing fails only itself: a malformed document is
+refused by 400 before it is queued, and an error in a worker by 500.
+If a worker crashes, the pool is started again. When too many
+requests are pending, new requests are refused by 503 at once, so that
+the service is never overloaded.
+
+usage:
+
+ $ python3 service.py --port 8080 -w 4
+
+ $ curl -d '{"documents": ["Some text. More text. "]}' localhost:8080/summarize
+
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+from document_process import CachedStemmer, DocProcess, \
+    SentenceTermMatrix, get_stemmer, init_stem_worker, load_stop_words
+from document_summarization import sparse_tf_idf
+from selection import SUMMARY_SIZE, THRESHOLD, select_sentences
+from similarity import SimilarityIndex
+
+HOST = '127.0.0.1'
+PORT = 8080
+WORKERS = 2
+# the max number of requests queued or being summarized
+MAX_PENDING = 64
+# the max number of requests in a batch, and the seconds to wait for
+# more requests after the first one of a batch
+BATCH_SIZE = 16
+BATCH_WINDOW = 0.005
+# the max bytes of a request body
+MAX_BODY = 16 * 2 ** 20
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found',
+           405: 'Method Not Allowed', 413: 'Payload Too Large',
+           500: 'Internal Server Error', 503: 'Service Unavailable'}
+
+# the warm state of a worker process
+_worker = {}
+
+
+def _init_worker(stop_word_path: str, stem_table: str):
+    _worker['stop_words'] = load_stop_words(stop_word_path)
+    init_stem_worker(stem_table)
+    _worker['stemmer'] = get_stemmer()
+
+
+'''
+the content of a document file, plain text is wrapped as the text. raise
+ValueError if the text of a document file can not be found, as
+text_sentences would fail on it.
+'''
+
+
+def _document(text: str):
+    if text.startswith('<TEXT>\n'):
+        begin = '<TEXT>\n'.__len__()
+    elif '\n<TEXT>\n' in text:
+        begin = text.index('\n<TEXT>\n') + '\n<TEXT>\n'.__len__()
+    else:
+        return '<TEXT>\n' + text + '\n</TEXT>\n'
+    if '\n</TEXT>\n' not in text[begin - 1:]:
+        raise ValueError('a document has <TEXT> but no </TEXT> line')
+    return text
+
+
+'''
+stack the sparse matrices block-diagonally, the columns of a matrix
+being offset by the columns of the ones before it. return the stacked
+matrix and the first row of every matrix, followed by the total rows.
+'''
+
+
+def block_diagonal(matrices: list):
+    row_offsets = np.cumsum([0] + [m.shape[0] for m in matrices])
+    col_offsets = np.cumsum([0] + [m.shape[1] for m in matrices])
+    entry_offsets = np.cumsum([0] + [m.nnz() for m in matrices])
+    indptr = np.concatenate(
+        [np.asarray(m.indptr[:-1]) + e
+         for m, e in zip(matrices, entry_offsets)] + [entry_offsets[-1:]])
+    indices = np.concatenate(
+        [np.asarray(m.indices, dtype=np.int64) + c
+         for m, c in zip(matrices, col_offsets)])
+    data = np.concatenate([np.asarray(m.data) for m in matrices])
+    return SentenceTermMatrix(indptr, indices, data, int(col_offsets[-1]),
+                              dtype=np.float64), row_offsets
+
+
+'''
+summarize a batch of jobs in a worker process. every job is a dict of
+the request body checked by make_job. every job is processed with its
+own vocabulary and TF-IDF matrix, and the matrices are stacked
+block-diagonally with the long sentence vectors concatenated, so that
+the sentences of all of the jobs are scored in one pass, each against
+the vector of its own job, as select_summary scores them. the
+sentences are then selected job by job. return a list of (summary,
+None) of every job, or (None, error) of a job failing, which does not
+fail the other jobs of the batch.
+'''
+
+
+def summarize_batch(jobs: list):
+    results = [None] * jobs.__len__()
+    # (job, data, s_w_matrix, long_sen_vector) of the processed jobs
+    processed = []
+    for i, job in enumerate(jobs):
+        try:
+            contents = job['documents']
+            data = DocProcess('', tuple(str(d) for d in range(
+                contents.__len__())), stop_words=_worker['stop_words'],
+                stemmer=_worker['stemmer'], contents=contents)
+            processed.append((i, data) + tuple(sparse_tf_idf(data)))
+        except Exception as e:
+            results[i] = (None, repr(e))
+    if not processed:
+        return results
+    s_w_matrix, row_offsets = block_diagonal([p[2] for p in processed])
+    index = SimilarityIndex(s_w_matrix)
+    # the norm of the vector of the job of every row
+    amps = np.repeat([np.linalg.norm(np.asarray(p[3], dtype=np.float64))
+                      for p in processed], np.diff(row_offsets))
+    scores = index.scores(np.concatenate([p[3] for p in processed]), amps)
+    for (i, data, matrix, vector), begin, end in zip(
+            processed, row_offsets[:-1], row_offsets[1:]):
+        job = jobs[i]
+        try:
+            rows = select_sentences(
+                SimilarityIndex(matrix, norms=index.norms[begin:end]),
+                scores[begin:end], lambda r: data.abstract(r).__len__(),
+                job.get('summary_size', SUMMARY_SIZE),
+                job.get('threshold', THRESHOLD), job.get('mmr_lambda'))
+            results[i] = ([data.abstract(r) for r in rows], None)
+        except Exception as e:
+            results[i] = (None, repr(e))
+    return results
+
+
+# summarize a batch in a worker process, and report the new stems
+def _run_jobs(jobs: list):
+    return summarize_batch(jobs), _worker['stemmer'].report()
+
+
+# check the request body and return it as a job, whose documents are
+# the contents of document files
+def make_job(body: bytes):
+    job = json.loads(body.decode('utf-8'))
+    if not isinstance(job, dict):
+        raise ValueError('the body must be a JSON object')
+    documents = job.get('documents')
+    if not isinstance(documents, list) or not documents \
+            or not all(isinstance(d, str) for d in documents):
+        raise ValueError('documents must be a list of strings')
+    for name, kind in (('summary_size', int), ('threshold', (int, float)),
+                       ('mmr_lambda', (int, float))):
+        if job.get(name) is not None and not isinstance(job[name], kind):
+            raise ValueError(name + ' is of a wrong type')
+    job['documents'] = [_document(d) for d in documents]
+    return job
+
+
+# a job failed in a worker, or its worker crashed
+class JobFailed(Exception):
+    pass
+
+
+class ServiceUnavailable(Exception):
+    pass
+
+
+'''
+the service, which batches the requests and runs the batches on a pool
+of worker processes
+'''
+
+
+class SummarizationService:
+    def __init__(self, workers: int = WORKERS,
+                 max_pending: int = MAX_PENDING,
+                 batch_size: int = BATCH_SIZE,
+                 batch_window: float = BATCH_WINDOW,
+                 stop_word_path: str = None, stem_table: str = None):
+        # fail at once if the stop word list can not be read
+        load_stop_words(stop_word_path)
+        self.stop_word_path = stop_word_path
+        # the stems learned by all of the workers, and their counts
+        self.stem_table = stem_table
+        self.stems = CachedStemmer(path=stem_table)
+        self.workers = workers
+        self.pool = self._start_pool()
+        self.restarts = 0
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self.pending = 0
+        self.served = 0
+        self.batches = 0
+        self.queue = None
+        self.batcher = None
+        self.server = None
+
+    # a pool whose workers are not forked from the service, which would
+    # keep the connections of the service open in the workers. the
+    # workers start with the stems learned so far
+    def _start_pool(self):
+        if 'forkserver' in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context('forkserver')
+        else:
+            context = multiprocessing.get_context('spawn')
+        return ProcessPoolExecutor(max_workers=self.workers,
+                                   mp_context=context,
+                                   initializer=_init_worker,
+                                   initargs=(self.stop_word_path,
+                                             self.stem_table))
+
+    async def start(self, host: str = HOST, port: int = PORT):
+        self.queue = asyncio.Queue()
+        self.batcher = asyncio.ensure_future(self._batcher())
+        self.server = await asyncio.start_server(self.handle, host, port)
+        return self.server
+
+    def close(self):
+        if self.server is not None:
+            self.server.close()
+        if self.batcher is not None:
+            self.batcher.cancel()
+        self.pool.shutdown(wait=True)
+        if self.stem_table is not None:
+            self.stems.save(self.stem_table)
+
+    # summarize a job, raise ServiceUnavailable if too many are pending
+    async def submit(self, job: dict):
+        if self.pending >= self.max_pending:
+            raise ServiceUnavailable()
+        self.pending += 1
+        try:
+            future = asyncio.get_event_loop().create_future()
+            await self.queue.put((job, future))
+            return await future
+        finally:
+            self.pending -= 1
+
+    # take the jobs from the queue batch by batch
+    async def _batcher(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.batch_window
+            while batch.__len__() < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(),
+                                                        timeout))
+                except asyncio.TimeoutError:
+                    break
+            asyncio.ensure_future(self._run_batch(batch))
+
+    # split the batch into one part per worker, so that no worker is
+    # idle while another summarizes the whole batch
+    async def _run_batch(self, batch: list):
+        self.batches += 1
+        size = -(-batch.__len__() // self.workers)
+        await asyncio.gather(*[self._run_part(batch[begin:begin + size])
+                               for begin in range(0, batch.__len__(), size)])
+
+    async def _run_part(self, batch: list):
+        loop = asyncio.get_event_loop()
+        pool = self.pool
+        try:
+            results, stems = await loop.run_in_executor(
+                pool, _run_jobs, [job for job, f in batch])
+        except Exception as e:
+            # a worker crashed, the pool is started again for the
+            # next batches unless it has been already
+            if isinstance(e, BrokenProcessPool) and pool is self.pool:
+                self.pool = self._start_pool()
+                self.restarts += 1
+                pool.shutdown(wait=False)
+            for job, future in batch:
+                if not future.done():
+                    future.set_exception(JobFailed(repr(e)))
+            return
+        self.stems.merge(stems)
+        for (job, future), (summary, error) in zip(batch, results):
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(JobFailed(error))
+            else:
+                future.set_result(summary)
+
+    async def route(self, method: str, target: str, body: bytes):
+        if target == '/health':
+            if method != 'GET':
+                return 405, {'error': 'use GET'}
+            return 200, {'pending': self.pending, 'served': self.served,
+                         'batches': self.batches, 'workers': self.workers,
+                         'restarts': self.restarts,
+                         'stem_cache': self.stems.info()}
+        if target != '/summarize':
+            return 404, {'error': 'not found'}
+        if method != 'POST':
+            return 405, {'error': 'use POST'}
+        try:
+            job = make_job(body)
+        except ValueError as e:
+            return 400, {'error': str(e)}
+        try:
+            summary = await self.submit(job)
+        except ServiceUnavailable:
+            return 503, {'error': 'too many pending requests'}
+        except JobFailed as e:
+            return 500, {'error': str(e)}
+        self.served += 1
+        return 200, {'summary': summary}
+
+    # serve one HTTP request of the connection
+    async def handle(self, reader, writer):
+        try:
+            try:
+                method, target, version = \
+                    (await reader.readline()).decode('latin-1').split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, value = line.decode('latin-1').split(':', 1)
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get('content-length', 0))
+                if length > MAX_BODY:
+                    status, payload = 413, {'error': 'the body is too large'}
+                else:
+                    body = await reader.readexactly(length)
+                    status, payload = await self.route(method, target, body)
+            except (ValueError, asyncio.IncompleteReadError):
+                status, payload = 400, {'error': 'bad request'}
+            content = json.dumps(payload).encode('utf-8')
+            header = 'HTTP/1.1 %d %s\r\n' % (status, REASONS[status]) \
+                + 'Content-Type: application/json\r\n' \
+                + 'Content-Length: %d\r\n' % content.__len__() \
+                + ('Retry-After: 1\r\n' if status == 503 else '') \
+                + 'Connection: close\r\n\r\n'
+            writer.write(header.encode('latin-1') + content)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='serve the summarization over HTTP')
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('-w', '--workers', type=int, default=WORKERS,
+                        help='number of worker processes')
+    parser.add_argument('--max-pending', type=int, default=MAX_PENDING,
+                        help='requests pending before 503 is returned')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--batch-window', type=float, default=BATCH_WINDOW,
+                        help='seconds to wait for a batch to fill')
+    parser.add_argument('-s', '--stop-words', help='stop word list file')
+    parser.add_argument('--stem-table',
+                        help='stem cache table, loaded by the workers and '
+                             'saved on shutdown')
+    args = parser.parse_args()
+
+    service = SummarizationService(args.workers, args.max_pending,
+                                   args.batch_size, args.batch_window,
+                                   args.stop_words, args.stem_table)
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    loop.run_until_complete(service.start(args.host, args.port))
+    print('Serving on %s:%d' % (args.host, args.port))
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+        # let the batcher be cancelled before the loop is closed
+        loop.run_until_complete(asyncio.sleep(0))
+        loop.close()
+
+
+'''
+//  main  //
+'''
+
+if __name__ == '__main__':
+    main()
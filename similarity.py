@@ -0,0 +1,204 @@
+"""
+        Similarity
+
+Cosine similarity of the sentence vectors, i.e. the rows of a
+sentence-word matrix, computed for many sentences at once.
+
+The L2 norms of the rows are computed only once, so that scoring all of
+the sentences against a vector is one matrix-vector product, and the
+pairwise similarity between sentences and a set of selected sentences
+is one matrix product per block of sentences, where a block is kept
+under a memory limit.
+
+The matrix can be a dense numpy array (including a memory-mapped one)
+or a sparse one in CSR form, i.e. an object with indptr, indices, data
+and shape, such as document_process.SentenceTermMatrix. The sentences
+a sparse matrix is compared with are kept sparse too, so that no array
+as big as the vocabulary is made per sentence.
+
+As in cos_similarity of document_summarization,
+
+ cos(a, b) = a.b / (|a| * |b| + 1e-9)
+
+so that the similarity with a zero vector is 0.
+
+"""
+
+import numpy as np
+
+# the bytes of the temporary arrays of a block of pairwise similarity
+MEMORY_LIMIT = 64 * 2 ** 20
+EPSILON = 1e-9
+
+
+def is_sparse(matrix):
+    return hasattr(matrix, 'indptr')
+
+
+# the row of every stored entry of a sparse matrix
+def _entry_rows(matrix):
+    return np.repeat(np.arange(matrix.shape[0]), np.diff(matrix.indptr))
+
+
+'''
+cosine similarity of the rows of a sentence-word matrix, whose row
+norms are cached
+'''
+
+
+class SimilarityIndex:
+    # norms are the row norms, if they have been computed already, such
+    # as for the rows of a block of a bigger matrix
+    def __init__(self, matrix, memory_limit: int = MEMORY_LIMIT,
+                 norms: np.ndarray = None):
+        self.matrix = matrix
+        self.memory_limit = memory_limit
+        if norms is not None:
+            self.norms = np.asarray(norms, dtype=np.float64)
+        elif is_sparse(matrix):
+            self.norms = np.sqrt(np.bincount(
+                _entry_rows(matrix),
+                weights=np.square(matrix.data, dtype=np.float64),
+                minlength=matrix.shape[0]))
+        else:
+            self.norms = np.sqrt(np.einsum('ij,ij->i', matrix, matrix))
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    # the rows as a dense array
+    def rows(self, rows):
+        rows = np.asarray(rows, dtype=np.int64)
+        if not is_sparse(self.matrix):
+            return np.asarray(self.matrix[rows], dtype=np.float64)
+        dense = np.zeros((rows.__len__(), self.matrix.shape[1]))
+        for i, r in enumerate(rows):
+            begin, end = self.matrix.indptr[r], self.matrix.indptr[r + 1]
+            dense[i, self.matrix.indices[begin:end]] = \
+                self.matrix.data[begin:end]
+        return dense
+
+    # the rows to be compared with, as the columns of a dense array of
+    # (words x k), or a list of the (indices, values) of the sparse rows
+    # with ascending indices
+    def _others(self, rows):
+        if not is_sparse(self.matrix):
+            return self.rows(rows).T
+        others = []
+        for r in np.asarray(rows, dtype=np.int64).tolist():
+            begin, end = self.matrix.indptr[r], self.matrix.indptr[r + 1]
+            indices = np.asarray(self.matrix.indices[begin:end])
+            order = np.argsort(indices, kind='stable')
+            others.append((indices[order], np.asarray(
+                self.matrix.data[begin:end], dtype=np.float64)[order]))
+        return others
+
+    # the values of a sparse row (indices, values) at the columns, 0 at
+    # the columns not stored
+    @staticmethod
+    def _values_at(other, columns):
+        indices, values = other
+        if not indices.__len__():
+            return np.zeros(columns.__len__())
+        pos = np.minimum(np.searchsorted(indices, columns),
+                         indices.__len__() - 1)
+        return np.where(indices[pos] == columns, values[pos], 0.0)
+
+    # the dot products of the rows with the columns of others, a dense
+    # array of (words x k), or for a sparse matrix a list of k sparse
+    # rows as made by _others. rows is a slice or an index array
+    def _dot(self, rows, others):
+        if not is_sparse(self.matrix):
+            return np.asarray(self.matrix[rows], dtype=np.float64).dot(others)
+        indptr = self.matrix.indptr
+        if isinstance(rows, slice):
+            # the stored entries of a run of rows are contiguous
+            ptr = np.asarray(indptr[rows.start:rows.stop + 1])
+            lengths = np.diff(ptr)
+            entries = slice(int(ptr[0]), int(ptr[-1]))
+            local_rows = np.repeat(np.arange(lengths.__len__()), lengths)
+        else:
+            # the positions of the stored entries of the rows, and the
+            # index in rows of every entry
+            lengths = indptr[rows + 1] - indptr[rows]
+            local_rows = np.repeat(np.arange(rows.__len__()), lengths)
+            starts = np.cumsum(lengths) - lengths
+            entries = np.arange(lengths.sum()) - starts[local_rows] \
+                + indptr[rows][local_rows]
+        indices = self.matrix.indices[entries]
+        data = np.asarray(self.matrix.data[entries], dtype=np.float64)
+        # the products of a column are summed up row by row in the order
+        # of the entries
+        sparse_others = isinstance(others, list)
+        k_size = others.__len__() if sparse_others else others.shape[1]
+        result = np.empty((lengths.__len__(), k_size))
+        for k in range(k_size):
+            if sparse_others:
+                column = self._values_at(others[k], indices)
+            else:
+                column = others[indices, k]
+            result[:, k] = np.bincount(local_rows, weights=column * data,
+                                       minlength=lengths.__len__())
+        return result
+
+    # the number of rows in a block whose dot products with k vectors
+    # are kept under the memory limit
+    def _block_size(self, k):
+        if is_sparse(self.matrix):
+            # a sparse row has nnz / rows entries on average
+            per_row = max(self.matrix.data.__len__() // max(len(self), 1), 1)
+            per_row = (per_row + 1) * max(k, 1) * 8
+        else:
+            per_row = (self.matrix.shape[1] + max(k, 1)) * 8
+        return max(self.memory_limit // per_row, 1)
+
+    '''
+    the cosine similarity of every sentence with the vector, in one
+    matrix-vector product when the matrix fits in the memory limit.
+    amps is the norm of the vector for every row, for a block-diagonal
+    matrix whose blocks are scored against their own parts of the
+    vector, or None for the norm of the whole vector
+    '''
+
+    def scores(self, vector: np.ndarray, amps: np.ndarray = None):
+        vector = np.asarray(vector, dtype=np.float64)
+        amp = np.linalg.norm(vector) if amps is None else amps
+        products = np.empty(len(self))
+        block = self._block_size(1)
+        for begin in range(0, len(self), block):
+            end = min(begin + block, len(self))
+            products[begin:end] = self._dot(slice(begin, end),
+                                            vector[:, None])[:, 0]
+        return products / (self.norms * amp + EPSILON)
+
+    '''
+    the cosine similarity of the sentences in rows with the ones in
+    selected, as an array of len(rows) x len(selected). the rows are
+    computed block by block under the memory limit.
+    '''
+
+    def pairwise(self, rows, selected):
+        rows = np.asarray(rows, dtype=np.int64)
+        selected = np.asarray(selected, dtype=np.int64)
+        result = np.empty((rows.__len__(), selected.__len__()))
+        if not selected.__len__():
+            return result
+        others = self._others(selected)
+        block = self._block_size(selected.__len__())
+        for begin in range(0, rows.__len__(), block):
+            block_rows = rows[begin:begin + block]
+            products = self._dot(block_rows, others)
+            result[begin:begin + block] = products / (
+                np.outer(self.norms[block_rows], self.norms[selected])
+                + EPSILON)
+        return result
+
+    # the cosine similarity of every sentence with the sentence in row
+    def similarity_to(self, row):
+        others = self._others([row])
+        products = np.empty(len(self))
+        block = self._block_size(1)
+        for begin in range(0, len(self), block):
+            end = min(begin + block, len(self))
+            products[begin:end] = self._dot(slice(begin, end), others)[:, 0]
+        return products / (self.norms * self.norms[row] + EPSILON)
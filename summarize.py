@@ -0,0 +1,228 @@
+"""
+        Summarize
+
+The command line of the summarization, which starts fast: only the
+standard library is imported at first, and the heavy modules are loaded
+only when a stage needs them.
+
+ numpy and the summarization   only if the summary is not cached
+ pyrouge                       only if --rouge-format is given
+ rouge.py                      only if model summaries are given
+
+The summaries are cached in doc/cache/summaries, keyed by the hash of
+the documents, the stop words and the parameters, so a job whose
+summary is cached reads its JSON file only. The cached clusters (see
+cluster_cache.py) are used as well when the summary is not cached.
+
+With --timing, the CPU time of the interpreter startup, the seconds
+spent in importing every module and in every stage, and the total are
+reported to stderr.
+
+usage:
+
+ $ python3 summarize.py doc/unprocessed_data/d30045t -o doc/systems/04systems/D30045.M.100.T.TT --timing
+
+"""
+
+import time
+
+_start = time.perf_counter()
+# the CPU time spent by the interpreter before running this module
+_startup = time.process_time()
+
+import argparse
+import hashlib
+import importlib
+import json
+import os
+import sys
+
+SUMMARY_CACHE_PATH = 'doc/cache/summaries/'
+CLUSTER_CACHE_PATH = 'doc/cache/clusters/'
+STOP_WORD_LIST = 'stop-word-list.csv'
+# as selection.SUMMARY_SIZE and selection.THRESHOLD, which are not
+# imported to start fast
+SUMMARY_SIZE = 665
+THRESHOLD = 0.7
+# change it whenever the summarization changes its results
+CACHE_VERSION = b'1'
+
+# (name, seconds) of the startup, the imports and the stages, in order
+_timings = [('interpreter startup (cpu)', _startup),
+            ('import standard library', time.perf_counter() - _start)]
+
+
+def _record(name: str, begin: float):
+    _timings.append((name, time.perf_counter() - begin))
+
+
+# import a module when it is needed, and record the seconds spent
+def load(name: str):
+    if name in sys.modules:
+        return sys.modules[name]
+    begin = time.perf_counter()
+    module = importlib.import_module(name)
+    _record('import ' + name, begin)
+    return module
+
+
+def _read(path: str):
+    infile = open(path, 'rb')
+    content = infile.read()
+    infile.close()
+    return content
+
+
+'''
+the hash of the documents, the stop word list and the parameters, which
+is the name of the cached summary
+'''
+
+
+def summary_key(contents: list, stop_words: bytes, params: dict):
+    h = hashlib.sha1(CACHE_VERSION)
+    for content in contents:
+        h.update(str(content.__len__()).encode() + b'\n')
+        h.update(content)
+    h.update(str(stop_words.__len__()).encode() + b'\n')
+    h.update(stop_words)
+    h.update(json.dumps(params, sort_keys=True).encode())
+    return h.hexdigest()
+
+
+def load_summary(cache_path: str, key: str):
+    path = os.path.join(cache_path, key + '.json')
+    if not os.path.exists(path):
+        return None
+    return json.loads(_read(path).decode('utf-8'))
+
+
+def save_summary(cache_path: str, key: str, summary: list):
+    os.makedirs(cache_path, exist_ok=True)
+    path = os.path.join(cache_path, key + '.json')
+    outfile = open(path + '.tmp', 'w')
+    json.dump(summary, outfile)
+    outfile.close()
+    os.replace(path + '.tmp', path)
+
+
+'''
+summarize the documents, from the summary cache if it is given and the
+summary is cached there. numpy and the summarization are imported only
+if the summary is not cached.
+'''
+
+
+def run(doc_path: str, doc_list: tuple, stop_word_path: str,
+        params: dict, cache_path: str = SUMMARY_CACHE_PATH,
+        cluster_cache_path: str = None):
+    begin = time.perf_counter()
+    raw = [_read(doc_path + f) for f in doc_list]
+    _record('read documents', begin)
+    key = None
+    if cache_path is not None:
+        begin = time.perf_counter()
+        key = summary_key(raw, _read(stop_word_path), params)
+        summary = load_summary(cache_path, key)
+        _record('summary cache', begin)
+        if summary is not None:
+            return summary, True
+
+    ds = load('document_summarization')
+    begin = time.perf_counter()
+    summary = ds.summarize(doc_path, doc_list,
+                           contents=[c.decode('utf-8') for c in raw],
+                           cache_path=cluster_cache_path,
+                           stop_words=stop_word_path, **params)
+    _record('summarize', begin)
+    if key is not None:
+        save_summary(cache_path, key, summary)
+    return summary, False
+
+
+def report_timings(cached: bool, out=sys.stderr):
+    for name, seconds in _timings:
+        print('%-40s %9.4f s' % (name, seconds), file=out)
+    total = _startup + time.perf_counter() - _start
+    print('%-40s %9.4f s%s' % ('total', total,
+                               ' (summary cached)' if cached else ''),
+          file=out)
+
+
+def _lambda(value: str):
+    return None if value.lower() == 'none' else float(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='summarize the documents of a cluster')
+    parser.add_argument('doc_path', help='directory of the documents')
+    parser.add_argument('documents', nargs='*',
+                        help='document files, all files in doc_path if none')
+    parser.add_argument('-o', '--output',
+                        help='summary file, one sentence per line; '
+                             'the summary is printed if it is not given')
+    parser.add_argument('-s', '--stop-words', default=STOP_WORD_LIST,
+                        help='stop word list file')
+    parser.add_argument('-b', '--summary-size', type=int,
+                        default=SUMMARY_SIZE)
+    parser.add_argument('-t', '--threshold', type=float, default=THRESHOLD)
+    parser.add_argument('-l', '--mmr-lambda', type=_lambda, default=None,
+                        help='weight of MMR, none for the threshold rule')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='do not use or write the caches')
+    parser.add_argument('-m', '--models', nargs='*', default=[],
+                        help='model summary files to score the summary by')
+    parser.add_argument('--rouge-format', action='store_true',
+                        help='convert the summaries by pyrouge '
+                             '(convert_format_pyrouge.py)')
+    parser.add_argument('--timing', action='store_true',
+                        help='report the import and startup costs')
+    begin = time.perf_counter()
+    args = parser.parse_args()
+    _record('parse arguments', begin)
+
+    doc_path = os.path.join(args.doc_path, '')
+    doc_list = tuple(args.documents) or tuple(
+        f for f in sorted(os.listdir(doc_path))
+        if not f.startswith('.') and os.path.isfile(doc_path + f))
+    params = {'summary_size': args.summary_size,
+              'threshold': args.threshold, 'mmr_lambda': args.mmr_lambda}
+    summary, cached = run(
+        doc_path, doc_list, args.stop_words, params,
+        None if args.no_cache else SUMMARY_CACHE_PATH,
+        None if args.no_cache else CLUSTER_CACHE_PATH)
+
+    if args.output:
+        outfile = open(args.output, 'w')
+        for sentence in summary:
+            outfile.write(sentence + '.\n')
+        outfile.close()
+    else:
+        for sentence in summary:
+            print(sentence + '.')
+
+    if args.models:
+        rouge = load('rouge')
+        begin = time.perf_counter()
+        score = rouge.RougeScorer().score(
+            summary, [rouge.read_summary(m) for m in args.models])
+        _record('rouge', begin)
+        for name in sorted(score):
+            print('%s R: %.5f P: %.5f F: %.5f'
+                  % (name.upper(), *score[name]), file=sys.stderr)
+    if args.rouge_format:
+        cfp = load('convert_format_pyrouge')
+        begin = time.perf_counter()
+        cfp.convert2rouge_format()
+        _record('rouge format', begin)
+    if args.timing:
+        report_timings(cached)
+
+
+'''
+//  main  //
+'''
+
+if __name__ == '__main__':
+    main()
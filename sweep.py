@@ -0,0 +1,216 @@
+"""
+        Parameter Sweep
+
+Summarize a cluster with every point of a grid of the parameters of
+the selection, i.e.
+
+ threshold     the similarity threshold of redundant sentences
+ summary_size  the size limit of a summary
+ centroid      the vector the sentences are scored against, one of
+                long_sentence  the TF-IDF vector of all sentences as a
+                               long one, as summarize does
+                tf_idf         the TF vector of the long sentence times
+                               the IDF of the words over the docs
+                mean           the mean of the TF-IDF sentence vectors
+ mmr_lambda    the weight of MMR, or none for the threshold rule
+
+The documents are processed and the TF-IDF matrix is computed only
+once. The sparse matrix is saved into temporary files, one per array as
+cluster_cache.py does, which are memory-mapped read-only by a pool of
+worker processes, so that a grid point costs only the selection. If model summaries are given, every summary is
+scored by rouge.py.
+
+The results are output as a table separated by tabs, one row per grid
+point, with the scores and the summary.
+
+usage:
+
+ $ python3 sweep.py doc/unprocessed_data/d30045t -t 0.5 0.6 0.7 -b 665 1000 \\
+       -c long_sentence mean -l none 0.5 -m doc/model/04model/D30045.M.100.T.? -w 4
+
+"""
+
+import argparse
+import itertools
+import os
+import shutil
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from document_process import DocProcess, SentenceTermMatrix, \
+    load_stop_words
+from document_summarization import sparse_tf_idf
+from rouge import RougeScorer, read_summary
+from selection import SUMMARY_SIZE, THRESHOLD, select_sentences
+from similarity import SimilarityIndex
+
+CENTROIDS = ('long_sentence', 'tf_idf', 'mean')
+
+'''
+the vectors of the centroid formulas of the documents in data. the idf
+of long_sen_vector is a constant, so every word weighs as its count.
+the idf of tf_idf is log(docs / docs containing the word) instead, so
+that the words in every doc weigh nothing and the ones in a few docs
+weigh the most. the mean is summed over the stored entries of the
+sparse s_w_matrix, the missing ones being 0.
+'''
+
+
+def centroid_vectors(data, s_w_matrix: SentenceTermMatrix,
+                     long_sen_vector: np.ndarray):
+    tf = data.word_totals / max(data.word_size_total(), 1)
+    idf = np.log(data.doc_size() / np.maximum(data.doc_freq, 1))
+    row_size, word_size = s_w_matrix.shape
+    mean = np.bincount(s_w_matrix.indices, weights=s_w_matrix.data,
+                       minlength=word_size) / max(row_size, 1)
+    return {'long_sentence': np.asarray(long_sen_vector),
+            'tf_idf': tf * idf,
+            'mean': mean}
+
+
+# the files of the arrays of the sparse matrix, as in cluster_cache.py
+MATRIX_FILES = ('tf_idf_indptr.npy', 'tf_idf_indices.npy',
+                'tf_idf_values.npy')
+
+# the state of a worker process, which is set up once by _init_worker
+_worker = {}
+
+
+# map the sparse matrix saved by save_matrix into a worker
+def _init_worker(work_path: str, word_size: int, vectors: dict,
+                 sizes: np.ndarray):
+    indptr, indices, values = [
+        np.load(os.path.join(work_path, f), mmap_mode='r')
+        for f in MATRIX_FILES]
+    _worker['index'] = SimilarityIndex(SentenceTermMatrix(
+        indptr, indices, values, word_size, dtype=np.float64))
+    _worker['vectors'] = vectors
+    _worker['sizes'] = sizes
+    # the scores of every centroid, computed once in a worker
+    _worker['scores'] = {}
+
+
+# select the rows of the summary at a grid point, in a worker
+def _evaluate(point: tuple):
+    threshold, summary_size, centroid, mmr_lambda = point
+    index = _worker['index']
+    scores = _worker['scores'].get(centroid)
+    if scores is None:
+        scores = index.scores(_worker['vectors'][centroid])
+        _worker['scores'][centroid] = scores
+    sizes = _worker['sizes']
+    return select_sentences(index, scores, lambda r: int(sizes[r]),
+                            summary_size, threshold, mmr_lambda)
+
+
+# save the arrays of the sparse matrix into work_path
+def save_matrix(work_path: str, s_w_matrix: SentenceTermMatrix):
+    arrays = (np.asarray(s_w_matrix.indptr, dtype=np.int64),
+              np.asarray(s_w_matrix.indices, dtype=np.int32),
+              np.asarray(s_w_matrix.data, dtype=np.float64))
+    for f, array in zip(MATRIX_FILES, arrays):
+        np.save(os.path.join(work_path, f), array)
+
+
+'''
+a generator of (point, summary) of every point of the grid, where a
+point is (threshold, summary_size, centroid, mmr_lambda). the points
+are evaluated by `workers` processes, in the order of the grid.
+'''
+
+
+def sweep(data, s_w_matrix: SentenceTermMatrix, long_sen_vector: np.ndarray,
+          grid: list, workers: int = 1):
+    sentences = [data.abstract(r) for r in range(data.sen_size_total())]
+    sizes = np.array([s.__len__() for s in sentences], dtype=np.int64)
+    vectors = centroid_vectors(data, s_w_matrix, long_sen_vector)
+    work_path = tempfile.mkdtemp(prefix='sweep-')
+    try:
+        save_matrix(work_path, s_w_matrix)
+        init_args = (work_path, s_w_matrix.shape[1], vectors, sizes)
+        if workers > 1:
+            pool = ProcessPoolExecutor(max_workers=workers,
+                                       initializer=_init_worker,
+                                       initargs=init_args)
+            try:
+                for point, rows in zip(grid, pool.map(_evaluate, grid)):
+                    yield point, [sentences[r] for r in rows]
+            finally:
+                pool.shutdown(wait=True)
+        else:
+            _init_worker(*init_args)
+            for point in grid:
+                yield point, [sentences[r] for r in _evaluate(point)]
+            _worker.clear()
+    finally:
+        shutil.rmtree(work_path, ignore_errors=True)
+
+
+# the grid points of all combinations of the values
+def make_grid(thresholds, summary_sizes, centroids, mmr_lambdas):
+    return list(itertools.product(thresholds, summary_sizes, centroids,
+                                  mmr_lambdas))
+
+
+def _lambda(value: str):
+    return None if value.lower() == 'none' else float(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='summarize a cluster with a grid of parameters')
+    parser.add_argument('doc_path', help='directory of the documents')
+    parser.add_argument('-t', '--thresholds', type=float, nargs='+',
+                        default=[THRESHOLD])
+    parser.add_argument('-b', '--summary-sizes', type=int, nargs='+',
+                        default=[SUMMARY_SIZE])
+    parser.add_argument('-c', '--centroids', nargs='+', choices=CENTROIDS,
+                        default=['long_sentence'])
+    parser.add_argument('-l', '--mmr-lambdas', type=_lambda, nargs='+',
+                        default=[None], help='none for the threshold rule')
+    parser.add_argument('-m', '--models', nargs='*', default=[],
+                        help='files of the model summaries to score by')
+    parser.add_argument('-s', '--stop-words', help='stop word list file')
+    parser.add_argument('-w', '--workers', type=int, default=1)
+    parser.add_argument('-o', '--output', help='output file of the table')
+    args = parser.parse_args()
+
+    doc_path = os.path.join(args.doc_path, '')
+    doc_list = tuple(f for f in sorted(os.listdir(doc_path))
+                     if not f.startswith('.')
+                     and os.path.isfile(doc_path + f))
+    stop_words = load_stop_words(args.stop_words)
+    data = DocProcess(doc_path, doc_list, stop_words=stop_words)
+    s_w_matrix, long_sen_vector = sparse_tf_idf(data)
+    grid = make_grid(args.thresholds, args.summary_sizes, args.centroids,
+                     args.mmr_lambdas)
+
+    scorer = RougeScorer() if args.models else None
+    models = [read_summary(m) for m in args.models]
+    outfile = open(args.output, 'w') if args.output else sys.stdout
+    outfile.write('threshold\tsummary_size\tcentroid\tmmr_lambda\t'
+                  'rouge-1\trouge-2\trouge-l\tsummary\n')
+    for point, summary in sweep(data, s_w_matrix, long_sen_vector, grid,
+                                args.workers):
+        threshold, summary_size, centroid, mmr_lambda = point
+        if scorer is not None:
+            score = scorer.score(summary, models)
+            f = ['%.5f' % score[k][2] for k in ('rouge-1', 'rouge-2',
+                                                 'rouge-l')]
+        else:
+            f = ['-'] * 3
+        outfile.write('\t'.join([str(threshold), str(summary_size), centroid,
+                                 str(mmr_lambda).lower()] + f
+                                + [' | '.join(summary)]) + '\n')
+    if outfile is not sys.stdout:
+        outfile.close()
+
+
+'''
+//  main  //
+'''
+
+if __name__ == '__main__':
+    main()